@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+build_pipeline.py
+─────────────────
+Incremental rebuild of the data + model artifacts:
+
+    download ──┬── recipes
+               └── training_data ── train
+
+Each stage is fingerprinted by the sha256 of its input files, its own source
+files and its parameters (seed, sample size).  Outputs are kept under
+`.build_cache/<stage>/<fingerprint>/`; a stage whose fingerprint is unchanged
+is skipped (outputs already in place) or restored from the cache, so only
+stages downstream of an actual change run.  Stages whose dependencies are
+done run in parallel.  Parameters reach the scripts as SMARTDIET_* env vars.
+
+`data/user_feedback.csv` is the live log the GUI appends to: no stage owns
+it, `train` only hashes it as an input.  A cached copy is never restored over
+an output edited since it was built – that needs `--force <stage>`.
+
+    python build_pipeline.py                  # everything
+    python build_pipeline.py train --seed 7   # train + whatever it needs
+    python build_pipeline.py --dry-run
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+ROOT  = Path(__file__).resolve().parent
+CACHE = ROOT / ".build_cache"
+STATE = CACHE / "state.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    cmd: list[str]
+    code: list[str]                     # files whose content defines the stage
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    deps: list[str] = field(default_factory=list)
+    params: list[str] = field(default_factory=list)   # keys of the params dict
+    cache: bool = True                  # keep output copies (off for raw downloads)
+    adopt: bool = False                 # outputs already on disk count as built
+
+
+STAGES = {s.name: s for s in [
+    Stage("download", [sys.executable, "download_recipes.py"], ["download_recipes.py"],
+          outputs=["data/RAW_recipes.csv", "data/RAW_interactions.csv"],
+          cache=False, adopt=True),
+    Stage("recipes", [sys.executable, "build_recipes.py"], ["build_recipes.py"],
+          inputs=["data/RAW_recipes.csv"], outputs=["data/recipes.csv"],
+          deps=["download"], params=["seed", "recipes"]),
+    Stage("training_data", [sys.executable, "build_training_data.py"],
+          ["build_training_data.py", "src/utils/feedback_store.py"],
+          inputs=["data/RAW_recipes.csv", "data/RAW_interactions.csv"],
+          outputs=["data/training_dataset.csv"], deps=["download"], params=["seed"]),
+    Stage("train", [sys.executable, "src/anfis_local/train_satisfaction.py"],
+          ["src/anfis_local/train_satisfaction.py", "models/anfis_diet.py",
+           "build_training_data.py"],                 # imported for profile sampling
+          inputs=["data/training_dataset.csv", "data/user_feedback.csv"],   # + live log
+          outputs=["models/anfis_satisfaction.pth", "models/scaler_satisfaction.pkl",
+                   "models/manifest.json"],                  # manifest restored last
+          deps=["training_data"], params=["seed"]),
+]}
+
+ENV = {"seed": "SMARTDIET_SEED", "recipes": "SMARTDIET_RECIPES"}
+
+
+# ───────── hashing ─────────
+class Hasher:
+    """sha256 of files, memoised on (mtime, size) across runs."""
+    def __init__(self, memo: dict):
+        self.memo = memo
+
+    def __call__(self, rel: str) -> str | None:
+        p = ROOT / rel
+        try:
+            st = p.stat()
+        except OSError:
+            return None
+        sig = [st.st_mtime_ns, st.st_size]
+        hit = self.memo.get(rel)
+        if hit and hit[:2] == sig: return hit[2]
+        h = hashlib.sha256()
+        with p.open("rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.memo[rel] = sig + [h.hexdigest()]
+        return h.hexdigest()
+
+
+def fingerprint(stage: Stage, params: dict, hasher: Hasher) -> str:
+    h = hashlib.sha256(stage.name.encode())
+    for rel in stage.code + stage.inputs:
+        h.update(f"{rel}={hasher(rel)}".encode())
+    for k in stage.params:
+        h.update(f"{k}={params[k]}".encode())
+    return h.hexdigest()[:16]
+
+
+# ───────── one stage ─────────
+def _outputs_match(stage: Stage, recorded: dict, hasher: Hasher) -> bool:
+    return bool(recorded) and all(hasher(o) == recorded.get(o) for o in stage.outputs)
+
+
+def run_stage(stage: Stage, key: str, state: dict, params: dict, hasher: Hasher,
+              dry: bool = False, forced: bool = False) -> str:
+    done = state["stages"].get(stage.name, {})
+    slot = CACHE / stage.name / key
+
+    if done.get("key") == key and _outputs_match(stage, done.get("outputs", {}), hasher):
+        return "up to date"
+    if stage.adopt and not done and not forced and all((ROOT / o).exists() for o in stage.outputs):
+        action = "adopted"
+    elif stage.cache and not forced and (slot / "outputs.json").exists():
+        action = "restored"
+        recorded = done.get("outputs", {})
+        edited = [o for o in stage.outputs
+                  if (ROOT / o).exists() and hasher(o) != recorded.get(o)]
+        if edited:
+            raise RuntimeError(f"{stage.name}: {edited} changed since the last build; "
+                               f"rerun with --force {stage.name} to replace them")
+        if not dry:
+            for o in stage.outputs:
+                (ROOT / o).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(slot / Path(o).name, ROOT / o)
+    else:
+        action = "built"
+        if not dry:
+            env = {**os.environ, **{ENV[k]: str(params[k]) for k in stage.params}}
+            t0 = time.time()
+            r = subprocess.run(stage.cmd, cwd=ROOT, env=env)
+            if r.returncode:
+                raise RuntimeError(f"{stage.name} failed (exit {r.returncode})")
+            missing = [o for o in stage.outputs if not (ROOT / o).exists()]
+            if missing:
+                raise RuntimeError(f"{stage.name} did not produce {missing}")
+            action += f" in {time.time() - t0:.1f}s"
+            if stage.cache:
+                slot.mkdir(parents=True, exist_ok=True)
+                for o in stage.outputs:
+                    shutil.copy2(ROOT / o, slot / Path(o).name)
+                (slot / "outputs.json").write_text(json.dumps(stage.outputs))
+    if not dry:
+        state["stages"][stage.name] = {"key": key,
+                                       "outputs": {o: hasher(o) for o in stage.outputs}}
+    return action
+
+
+# ───────── scheduler ─────────
+def _closure(targets: list[str]) -> list[str]:
+    seen: list[str] = []
+    def visit(n):
+        if n in seen: return
+        for d in STAGES[n].deps: visit(d)
+        seen.append(n)
+    for t in targets: visit(t)
+    return seen
+
+
+def build(targets=None, params=None, force=(), jobs: int = 2, dry: bool = False) -> dict:
+    params = {"seed": 42, "recipes": 200, **(params or {})}
+    order = _closure(list(targets or STAGES))
+    state = json.loads(STATE.read_text()) if STATE.exists() else {}
+    state.setdefault("stages", {}); state.setdefault("hashes", {})
+    for name in force: state["stages"].pop(name, None)
+    hasher = Hasher(state["hashes"])
+    if dry: print("🔎 dry run – nothing is executed; downstream keys use current files")
+
+    results, running = {}, {}
+    with ThreadPoolExecutor(jobs) as pool:
+        while len(results) < len(order):
+            for name in order:                           # start whatever is unblocked
+                if name in results or name in running: continue
+                if all(d in results for d in STAGES[name].deps):
+                    # inputs are final once every dep has finished
+                    key = fingerprint(STAGES[name], params, hasher)
+                    running[name] = pool.submit(run_stage, STAGES[name], key, state,
+                                                params, hasher, dry, name in force)
+            finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name, fut in list(running.items()):
+                if fut in finished:
+                    del running[name]
+                    try:
+                        results[name] = fut.result()
+                    except Exception as e:
+                        if not dry:
+                            CACHE.mkdir(exist_ok=True); STATE.write_text(json.dumps(state, indent=1))
+                        sys.exit(f"❌ {e}")
+                    print(f"{'✅' if results[name].startswith('built') else '⏭ '} "
+                          f"{name:<14} {results[name]}")
+
+    if not dry:
+        CACHE.mkdir(exist_ok=True)
+        STATE.write_text(json.dumps(state, indent=1))
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Cached, incremental SmartDiet build.")
+    ap.add_argument("targets", nargs="*", metavar="stage",
+                    help=f"stages to bring up to date ({', '.join(STAGES)}); default all")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--recipes", type=int, default=200, help="recipes sampled into recipes.csv")
+    ap.add_argument("--force", nargs="*", default=[], choices=list(STAGES), metavar="stage")
+    ap.add_argument("--jobs", type=int, default=2)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    if set(args.targets) - set(STAGES):
+        ap.error(f"unknown stage(s): {', '.join(sorted(set(args.targets) - set(STAGES)))}")
+
+    build(args.targets, {"seed": args.seed, "recipes": args.recipes},
+          args.force, args.jobs, args.dry_run)
@@ -2,7 +2,7 @@
 """
 build_recipes.py
 ────────────────
-Create a clean, 200‑row sample **data/recipes.csv** from whichever raw source
+Create a clean, 200‑row (SMARTDIET_RECIPES) sample **data/recipes.csv** from whichever raw source
 CSV is present in *data/*.
 
 Priority order:
@@ -17,6 +17,7 @@ Run from project root **or** any sub‑folder:
 
 from __future__ import annotations
 import ast
+import os
 import random
 import sys
 from pathlib import Path
@@ -28,6 +29,8 @@ import pandas as pd
 # ------------------------------------------------------------------
 ROOT = Path(__file__).resolve().parents[1] if (__file__).endswith("src" + str(Path(__file__).suffix)) else Path(__file__).resolve().parent
 DATA_DIR = (ROOT / "data").resolve()
+SEED     = int(os.environ.get("SMARTDIET_SEED", 42))
+TARGET   = int(os.environ.get("SMARTDIET_RECIPES", 200))   # recipes kept
 
 RAW     = DATA_DIR / "RAW_recipes.csv"
 PP      = DATA_DIR / "PP_recipes.csv"
@@ -92,16 +95,15 @@ df["diet_type"] = df.apply(tag_diet, axis=1)
 df = df[df["diet_type"].isin(["vegan", "balanced", "high_protein", "low_carb"])]
 
 # ------------------------------------------------------------------
-# 4. Even sample (≈200) + add prep_time & meal_type
+# 4. Even sample (≈TARGET) + add prep_time & meal_type
 # ------------------------------------------------------------------
-target = 200
 sampled = (
     df.groupby("diet_type", group_keys=False)
-      .apply(lambda g: g.sample(min(target // 4, len(g)), random_state=42))
+      .apply(lambda g: g.sample(min(TARGET // 4, len(g)), random_state=SEED))
       .reset_index(drop=True)
 )
 
-rng = random.Random(42)
+rng = random.Random(SEED)
 sampled["prep_time"] = [rng.randint(5, 30) for _ in range(len(sampled))]
 
 def meal(minutes):  # simple heuristic
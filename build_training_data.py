@@ -1,5 +1,5 @@
 """
-Build training_dataset.csv from 20 k Food.com recipes + interactions.
+Build training_dataset.csv from 20 k Food.com recipes + interactions.
 
 Features
 ────────
@@ -8,31 +8,31 @@ calories, total_fat, sugar, sodium, protein, saturated_fat, carbs
 diet_type  (vegan / balanced / high_protein / low_carb)
 satisfaction  (1–5 star average per recipe)
 
+Columns follow `utils.feedback_store.COLUMNS`, the schema the GUI appends
+to; `timestamp` and `recipe_id` stay empty – Food.com ids are not catalog ids.
+The live log `data/user_feedback.csv` is never touched: training reads both.
+
 Outputs
 ───────
-data/training_dataset.csv   (~8 k rows)
+data/training_dataset.csv   (~8 k rows)
+
+The recipe‑level steps (`load_recipes`) and the synthetic profile sampler
+(`sample_profiles`) are importable, so `train_satisfaction.py --augment` can
+draw many profiles per recipe in memory instead of reading this CSV.
 """
 from pathlib import Path
+import os, sys
 import pandas as pd, numpy as np
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from utils.feedback_store import COLUMNS  # noqa: E402
+
 DATA = Path("data")
-RNG  = np.random.default_rng(42)
-
-# 1. load
-recipes = pd.read_csv(DATA / "RAW_recipes.csv",
-                      usecols=["id","nutrition","tags"])
-reviews = pd.read_csv(DATA / "RAW_interactions.csv",
-                      usecols=["recipe_id","rating"])
-
-# 2. nutrition → 7 cols
-nut_cols = ["calories","total_fat","sugar","sodium",
-            "protein","saturated_fat","carbs"]
-recipes[nut_cols] = (
-    recipes["nutrition"]
-    .str.strip("[]").str.split(",", expand=True)
-    .astype(float)
-)
-recipes = recipes.drop(columns="nutrition")
+SEED = int(os.environ.get("SMARTDIET_SEED", 42))
+
+nut_cols   = ["calories","total_fat","sugar","sodium",
+              "protein","saturated_fat","carbs"]
+diet_flags = ["is_vegan", "is_balanced", "is_high_protein", "is_low_carb"]
 
 # 3. diet_type from tags
 def diet_from_tags(t: str) -> str|None:
@@ -43,31 +43,57 @@ def diet_from_tags(t: str) -> str|None:
     if "high-protein" in t or "paleo" in t:                 return "high_protein"
     return None
 
-recipes["diet_type"] = recipes["tags"].fillna("").apply(diet_from_tags)
-recipes = recipes.dropna(subset=["diet_type"]).drop(columns="tags")
+def load_recipes(data: Path = DATA) -> pd.DataFrame:
+    """Steps 1‑4: one row per rated, diet‑tagged recipe (nutrients, flags, satisfaction)."""
+    # 1. load
+    recipes = pd.read_csv(data / "RAW_recipes.csv",
+                          usecols=["id","nutrition","tags"])
+    reviews = pd.read_csv(data / "RAW_interactions.csv",
+                          usecols=["recipe_id","rating"])
 
-# 3b. one-hot flags for each diet class (used as features)
-for d in ["vegan", "balanced", "high_protein", "low_carb"]:
-    recipes[f"is_{d}"] = (recipes["diet_type"] == d).astype(int)
+    # 2. nutrition → 7 cols
+    recipes[nut_cols] = (
+        recipes["nutrition"]
+        .str.strip("[]").str.split(",", expand=True)
+        .astype(float)
+    )
+    recipes = recipes.drop(columns="nutrition")
 
-# 4. satisfaction from interactions
-avg_rating = reviews.groupby("recipe_id")["rating"].mean().round(1)
-recipes = recipes.join(avg_rating, on="id")
-recipes = recipes.rename(columns={"rating":"satisfaction"}).dropna()
+    recipes["diet_type"] = recipes["tags"].fillna("").apply(diet_from_tags)
+    recipes = recipes.dropna(subset=["diet_type"]).drop(columns="tags")
 
-# 5. synthetic user profile (1 row per recipe)
-N = len(recipes)
-recipes["gender"]         = RNG.choice(["M","F"], size=N)
-recipes["age"]            = RNG.integers(18,70, size=N)
-recipes["height"]         = RNG.integers(150,190, size=N)
-recipes["weight"]         = recipes["height"]*0.45 + RNG.integers(-20,25,size=N)
-recipes["activity_level"] = RNG.choice(["Low","Medium","High"], size=N)
-recipes["satiety"]        = RNG.integers(1,6, size=N)
+    # 3b. one-hot flags for each diet class (used as features)
+    for d in ["vegan", "balanced", "high_protein", "low_carb"]:
+        recipes[f"is_{d}"] = (recipes["diet_type"] == d).astype(int)
 
-# 6. reorder & save
-diet_flags = ["is_vegan", "is_balanced", "is_high_protein", "is_low_carb"]
-out_cols = ["age","gender","height","weight","activity_level",
-            "satiety","diet_type","satisfaction"] + nut_cols + diet_flags
-out = recipes[out_cols]
-out.to_csv(DATA / "user_feedback.csv", index=False)
-print(f"✅  Wrote {len(out)} rows to data/user_feedback.csv")
+    # 4. satisfaction from interactions
+    avg_rating = reviews.groupby("recipe_id")["rating"].mean().round(1)
+    recipes = recipes.join(avg_rating, on="id")
+    return recipes.rename(columns={"rating":"satisfaction"}).dropna()
+
+def sample_profiles(n: int, rng: np.random.Generator) -> dict:
+    """Step 5: n synthetic user profiles as column arrays."""
+    gender   = rng.choice(["M","F"], size=n)
+    age      = rng.integers(18,70, size=n)
+    height   = rng.integers(150,190, size=n)
+    weight   = height*0.45 + rng.integers(-20,25,size=n)
+    activity = rng.choice(["Low","Medium","High"], size=n)
+    satiety  = rng.integers(1,6, size=n)
+    return {"gender": gender, "age": age, "height": height, "weight": weight,
+            "activity_level": activity, "satiety": satiety}
+
+def build(data: Path = DATA, seed: int = SEED) -> pd.DataFrame:
+    recipes = load_recipes(data)
+
+    # 5. synthetic user profile (1 row per recipe)
+    for col, vals in sample_profiles(len(recipes), np.random.default_rng(seed)).items():
+        recipes[col] = vals
+
+    # 6. reorder into the feedback log schema
+    return recipes.reindex(columns=COLUMNS)
+
+
+if __name__ == "__main__":
+    out = build()
+    out.to_csv(DATA / "training_dataset.csv", index=False)
+    print(f"✅  Wrote {len(out)} rows to data/training_dataset.csv")
@@ -4,18 +4,18 @@
 # • ingredients popup restored
 # • works from project root with src/ sibling folder
 
-import csv
 import datetime as dt
 import sys
 import webbrowser
 from pathlib import Path
 
-from PySide6.QtCore import Qt
+import numpy as np
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
 from PySide6.QtGui  import QFont
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QFormLayout,
-    QLabel, QSpinBox, QComboBox, QPushButton, QTableWidget,
-    QTableWidgetItem, QMessageBox, QHeaderView
+    QLabel, QSpinBox, QComboBox, QLineEdit, QPushButton, QTableView,
+    QMessageBox, QHeaderView
 )
 
 # ─── make project_root/src importable ───────────────────────────
@@ -25,16 +25,20 @@ if str(SRC) not in sys.path:                    # add only once
     sys.path.insert(0, str(SRC))
 # ────────────────────────────────────────────────────────────────
 
-from utils import data_loader
-from engine import recommender
+from utils import data_loader, feedback_store, shared_features
+from engine import recommender, personalize, bucket_cache
+from engine.similarity import RecipeIndex
+from engine.ingredients import IngredientIndex
+from engine.trace import recorder_from_env
 from fuzzy_logic import rules      # ← local fuzzy package (with __init__.py)
+from anfis_local.infer import ARTIFACTS
 
 # ─── stylesheet ─────────────────────────────────────────────────
 STYLE = """
 QWidget{background:#2b2b2b;color:#f0f0f0;font-family:Arial;font-size:13px;}
 QPushButton{background:#0078d7;color:#fff;font-weight:bold;height:34px;border-radius:4px;font-size:12pt;}
 QPushButton:hover{background:#2893ff;}
-QTableWidget{background:#1e1e1e;alternate-background-color:#2a2a2a;selection-background-color:#444;}
+QTableView{background:#1e1e1e;alternate-background-color:#2a2a2a;selection-background-color:#444;}
 QHeaderView::section{background:#444;padding:4px;border:1px solid #333;font-weight:bold;}
 """
 
@@ -42,19 +46,88 @@ QHeaderView::section{background:#444;padding:4px;border:1px solid #333;font-weig
 FEEDBACK_CSV = ROOT / "data" / "user_feedback.csv"
 FEEDBACK_CSV.parent.mkdir(exist_ok=True)
 
-def append_feedback(profile, plan):
+def append_feedback(profile, plan, rating=None):
+    """Log the shown plan (rating 1–5, or None for "shown, not rated"); returns the rows."""
     now = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with FEEDBACK_CSV.open("a", newline="") as f:
-        w = csv.writer(f)
-        for _, r in plan.iterrows():
-            w.writerow([
-                now,
-                profile["age"], profile["height"], profile["weight"], profile["activity_level"],
-                profile["satiety"],
-                r["recipe_id"], r["name"], r["diet_type"],
-                r["calories"], r["total_fat"], r["sugar"], r["sodium"],
-                r["protein"], r["saturated_fat"], r["carbs"]
-            ])
+    rows = feedback_store.feedback_rows(profile, plan, rating, timestamp=now)
+    feedback_store.append(rows, FEEDBACK_CSV)
+    return rows
+
+# ─── result model ───────────────────────────────────────────────
+class PlanModel(QAbstractTableModel):
+    """
+    Read‑only view over a result DataFrame's columns as NumPy arrays.
+    Cells are formatted only when painted, sorting permutes a row index
+    (no data copied) and rows are exposed in FETCH‑sized steps via
+    canFetchMore/fetchMore, so cost follows the visible rows, not the result.
+    """
+    HEADERS = ["Meal", "Recipe", "Calories", "Diet Type", "Score"]
+    FETCH = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.set_frame(None)
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        if df is None or df.empty:
+            self._cols, self._ids, n = [np.empty(0)] * 5, np.empty(0), 0
+        else:
+            self._cols = [df["meal_type"].to_numpy(), df["name"].to_numpy(),
+                          df["calories"].to_numpy(float), df["diet_type"].to_numpy(),
+                          df["score"].to_numpy(float)]
+            self._ids, n = df["recipe_id"].to_numpy(), len(df)
+        self._order = np.arange(n)
+        self._loaded = min(n, self.FETCH)
+        self.endResetModel()
+
+    def recipe_id(self, row: int):
+        return self._ids[self._order[row]]
+
+    # ── Qt model API ──
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._order)
+
+    def fetchMore(self, parent=QModelIndex()):
+        n = min(self.FETCH, len(self._order) - self._loaded)
+        if n <= 0: return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + n - 1)
+        self._loaded += n
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        if role == Qt.TextAlignmentRole: return int(Qt.AlignCenter)
+        if role != Qt.DisplayRole: return None
+        c, v = index.column(), self._cols[index.column()][self._order[index.row()]]
+        if c == 1: return str(v).title()
+        if c == 2: return f"{v:.0f}"
+        if c == 3: return str(v).replace("_", " ").title()
+        if c == 4: return f"{v:.2f}"
+        return str(v)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self._cols):                   # −1 = plan order
+            self.layoutAboutToBeChanged.emit()
+            self._order = np.arange(len(self._order))
+            self.layoutChanged.emit(); return
+        col = self._cols[column]
+        key = col if col.dtype.kind == "f" else np.char.lower(col.astype(str))
+        rank = np.unique(key, return_inverse=True)[1]           # ties keep plan order
+        self.layoutAboutToBeChanged.emit()
+        self._order = np.argsort(rank if order == Qt.AscendingOrder else -rank, kind="stable")
+        self.layoutChanged.emit()
 
 # ─── GUI class ─────────────────────────────────────────────────
 class DietApp(QMainWindow):
@@ -74,9 +147,11 @@ class DietApp(QMainWindow):
         self.wgt = QSpinBox(); self.wgt.setRange(0, 200); self.wgt.setSpecialValueText("")
         self.act = QComboBox(); self.act.addItems(["Low", "Medium", "High"]); self.act.setCurrentIndex(-1)
         self.sat = QSpinBox(); self.sat.setRange(0, 5)
+        self.sat.valueChanged.connect(self.rerank)
+        self.excl = QLineEdit(); self.excl.setPlaceholderText("e.g. peanut, milk")
         for lbl, wdg in [("Age", self.age), ("Height (cm)", self.hgt),
                          ("Weight (kg)", self.wgt), ("Activity", self.act),
-                         ("Satiety (0–5)", self.sat)]:
+                         ("Satiety (0–5)", self.sat), ("Exclude ingredients", self.excl)]:
             form.addRow(lbl, wdg)
         lay.addLayout(form)
 
@@ -86,30 +161,54 @@ class DietApp(QMainWindow):
         btn.clicked.connect(self.recommend)
         lay.addWidget(btn)
 
+        # ---------- rating of the plan on screen ----------
+        rate = QFormLayout()
+        self.rating = QComboBox(); self.rating.addItems(["1", "2", "3", "4", "5"])
+        self.rating.setCurrentIndex(-1)
+        rate_btn = QPushButton("Rate This Plan"); rate_btn.clicked.connect(self.rate)
+        rate.addRow("Rating (1–5)", self.rating); rate.addRow(rate_btn)
+        lay.addLayout(rate)
+
         # ---------- info labels ----------
         self.bmi_lbl  = QLabel("BMI: –")
         self.diet_lbl = QLabel("Recommended Diet: –")
         lay.addWidget(self.bmi_lbl); lay.addWidget(self.diet_lbl)
 
         # ---------- result table ----------
-        self.table = QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels(["Meal", "Recipe", "Calories", "Diet Type", "Score"])
+        self.model = PlanModel(self)
+        self.table = QTableView(); self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         self.table.setAlternatingRowColors(True)
-        self.table.cellClicked.connect(self.detail)
+        self.table.clicked.connect(self.detail)
         lay.addWidget(self.table)
 
         self.status = QLabel(""); lay.addWidget(self.status)
 
         # ---------- load recipes once ----------
-        self.recipes_df, _ = data_loader.load_data()
+        recipes, feedback_df = data_loader.load_data(compacted=True)
+        self.features = shared_features.attach()    # None until published
+        self.recipes_df = recommender.prepare_catalog(recipes, self.features)   # parsed once
+        del recipes
+        self.index = RecipeIndex(self.recipes_df)
+        self.ingredients = IngredientIndex(self.recipes_df)
+        self.feedback = personalize.FeedbackMatrix.from_frame(feedback_df)
+        self.session = recommender.RecommendSession(self.recipes_df, self.features,
+                                                    self.feedback)
+        self.buckets = bucket_cache.load_table(self.recipes_df)   # None until built
+        self.shown = False                           # a plan is on screen
+        self.last = None                             # (profile, plan) last written to the log
+        self.tracer = recorder_from_env()            # SMARTDIET_TRACE=… captures requests
+
+        # ---------- pick up retrained models without restart ----------
+        ARTIFACTS.watch()
 
     # ─── recommendation ────────────────────────────────────────
-    def recommend(self):
-        if not (self.hgt.value() and self.wgt.value() and self.age.value() and self.act.currentIndex() != -1):
-            QMessageBox.warning(self, "Missing Info", "Fill all fields.")
-            return
+    def _filled(self):
+        return bool(self.hgt.value() and self.wgt.value() and self.age.value() and self.act.currentIndex() != -1)
 
+    def _plan(self, rerank=False):
         profile = {
             "age": self.age.value(),
             "height": self.hgt.value(),
@@ -131,41 +230,71 @@ class DietApp(QMainWindow):
         profile["diet_type"] = best
         self.diet_lbl.setText(f"Recommended Diet: {best.capitalize()}")
 
-        plan = recommender.plan_day(profile, fz, self.recipes_df, per_session=3)
-
-        # fill table
-        self.table.clearContents()
-        self.table.setRowCount(len(plan))
-        for r, row in plan.reset_index(drop=True).iterrows():
-            for c, val in enumerate([
-                row["meal_type"],
-                row["name"].title(),
-                f"{row['calories']:.0f}",
-                row["diet_type"].replace("_", " ").title(),
-                f"{row['score']:.2f}"
-            ]):
-                it = QTableWidgetItem(str(val))
-                it.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(r, c, it)
+        exclude = [t for t in self.excl.text().split(",") if t.strip()]
+        if self.tracer: self.tracer.record(profile, exclude=exclude, rerank=rerank)
+        mask = self.ingredients.mask(exclude=exclude) if exclude else None
+        plan = None
+        if self.buckets and mask is None and not self.feedback.has_user(profile):
+            plan = self.buckets.plan_day(profile, per_session=3)   # None → live
+        if plan is None:
+            plan = self.session.plan_day(profile, fz, per_session=3, mask=mask)
+
+        # fill table (plan order; click a header to sort)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.set_frame(plan)
+        self.shown = not plan.empty
+        return profile, plan
 
+    def rerank(self):
+        """Satiety tweak: re‑blend cached scores, no feedback written."""
+        if self.shown and self._filled():
+            self._plan(rerank=True)
+
+    def recommend(self):
+        if not self._filled():
+            QMessageBox.warning(self, "Missing Info", "Fill all fields.")
+            return
+
+        profile, plan = self._plan()
         if plan.empty:
             QMessageBox.information(self, "No Recipes", "No matches."); return
 
-        append_feedback(profile, plan)
-        self.status.setText("✔ Plan updated & feedback saved.")
+        self.last = (profile, plan)
+        if not self._log(profile, plan): return      # unrated: counts as shown only
+        self.status.setText(f"✔ Plan updated & feedback saved. (model {plan['model_version'].iloc[0]})")
+
+    def rate(self):
+        if self.last is None or self.rating.currentIndex() == -1:
+            QMessageBox.warning(self, "Nothing to Rate", "Generate a plan and pick a rating.")
+            return
+        rows = self._log(*self.last, rating=int(self.rating.currentText()))
+        if rows is None: return
+        self.feedback.add(rows)                      # next plan already uses it
+        self.status.setText(f"✔ Rated {self.rating.currentText()}/5 – thanks!")
+
+    def _log(self, profile, plan, rating=None):
+        """append_feedback, with a warning instead of a lost slot if the log can't be written."""
+        try:
+            return append_feedback(profile, plan, rating)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Feedback Not Saved", f"{FEEDBACK_CSV}:\n{e}")
+            self.status.setText("⚠ Feedback not saved.")
+            return None
 
     # ─── detail popup ───────────────────────────────────────────
-    def detail(self, row, _):
-        name = self.table.item(row, 1).text().lower()
-        rec  = self.recipes_df[self.recipes_df["name"].str.lower() == name]
-        if rec.empty: return
-        url = rec.iloc[0].get("url", "")
-        if url and url.startswith("http"):
+    def detail(self, index):
+        rec = self.index.by_id(self.model.recipe_id(index.row()))
+        if rec is None: return
+        url = rec.get("url", "")
+        if isinstance(url, str) and url.startswith("http"):
             webbrowser.open(url)
         else:
-            ing = rec.iloc[0].get("ingredients", "Ingredients not available.")
+            ing = rec.get("ingredients", "Ingredients not available.")
+            alt = self.index.similar(rec["recipe_id"], k=3, same_diet=True)
+            alt = ", ".join(n.title() for n in alt["name"]) or "–"
             QMessageBox.information(self, "Recipe Details",
-                                    f"<b>{rec.iloc[0]['name'].title()}</b><br><br>{ing}")
+                                    f"<b>{rec['name'].title()}</b><br><br>{ing}"
+                                    f"<br><br><i>Similar:</i> {alt}")
 
 # ─── launch app ────────────────────────────────────────────────
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from engine.ingredients import IngredientIndex
+
+
+RECIPES = [
+    "['eggs', 'flour', 'milk']",                      # 0
+    "['eggplant', 'olive oil', 'garlic']",            # 1
+    "['frozen peas', 'butter']",                      # 2
+    "['peaches', 'sugar']",                           # 3
+    "['peanut butter', 'bread']",                     # 4
+    "['white rice', 'soy sauce']",                    # 5
+    "['black licorice', 'chocolate']",                # 6
+    "['smoked ham', 'cheese']",                       # 7
+    "['graham crackers', 'butter']",                  # 8
+    "['sweet corn', 'salt']",                         # 9
+    "['black peppercorns', 'beef']",                  # 10
+    "['walnuts', 'honey']",                           # 11
+    "['nutmeg', 'cream']",                            # 12
+    "['buttermilk', 'flour']",                        # 13
+    "['peanuts', 'butter', 'jam']",                   # 14
+    "['canned chickpeas', 'tahini']",                 # 15
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return IngredientIndex(pd.DataFrame({"ingredients": RECIPES}))
+
+
+@pytest.mark.parametrize("term, expected", [
+    ("egg",  [0]),                    # not eggplant
+    ("pea",  [2, 15]),                # not peaches, not peanuts
+    ("rice", [5]),                    # not licorice
+    ("ham",  [7]),                    # not graham crackers
+    ("corn", [9]),                    # not peppercorns
+    ("nut",  [4, 11, 14]),            # walnut, peanut – not nutmeg
+    ("milk", [0, 13]),                # buttermilk is milk
+    ("Eggs", [0]),
+])
+def test_word_matches(index, term, expected):
+    assert index.search(term).tolist() == expected
+
+
+def test_phrase_stays_inside_one_ingredient(index):
+    assert index.search("peanut butter").tolist() == [4]       # 14 has both on two lines
+
+
+def test_exclude_keeps_lookalikes(index):
+    mask = index.mask(exclude=["egg", "nut"])
+    assert not mask[[0, 4, 11, 14]].any()
+    assert mask[[1, 3, 12]].all()                              # eggplant, peaches, nutmeg
+
+
+def test_unknown_term(index):
+    assert index.search("saffron").size == 0
+    assert index.mask(exclude=["saffron"]).all()
+    assert np.array_equal(index.mask(include=["butter"], exclude=["peanut"]),
+                          np.isin(np.arange(len(RECIPES)), [2, 8]))
@@ -0,0 +1,98 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+try:
+    from engine import planner
+except Exception as e:                     # needs the trained model artifacts
+    pytest.skip(f"engine unavailable: {e}", allow_module_level=True)
+
+
+BOUNDS = {"calories": (1200, 2000), "sodium": (None, 150)}
+
+
+def _catalog(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "recipe_id": np.arange(n),
+        "name": [f"recipe {i}" for i in range(n)],
+        "meal_type": rng.choice(["Breakfast", "Lunch", "Dinner"], n),
+        "calories": rng.uniform(100, 900, n).round(1),
+        "sodium": rng.uniform(5, 80, n).round(1),
+        "score": rng.uniform(0, 5, n),
+    })
+    # one dinner far ahead of the rest – every top combination wants it
+    star = df.index[df["meal_type"] == "Dinner"][0]
+    df.loc[star, ["score", "calories", "sodium"]] = [50.0, 500.0, 10.0]
+    return df
+
+
+@pytest.fixture
+def fixed_scores(monkeypatch):
+    monkeypatch.setattr(planner, "score_recipes", lambda p, f, df, *a, **k: df.copy())
+
+
+def _check(plan, days, window, bounds=BOUNDS):
+    assert len(plan) == 3 * days
+    totals = plan.groupby("day")[list(bounds)].sum()
+    for col, (lo, hi) in bounds.items():
+        if lo is not None: assert (totals[col] >= lo - 1e-6).all()
+        if hi is not None: assert (totals[col] <= hi + 1e-6).all()
+    for rid, days_used in plan.groupby("recipe_id")["day"]:
+        gaps = np.diff(np.sort(days_used.to_numpy()))
+        assert (gaps >= window).all(), f"recipe {rid} repeats within {window} days"
+
+
+def test_bounds_and_repeat_window(fixed_scores):
+    plan = planner.plan_days({}, {}, _catalog(), days=7, bounds=BOUNDS,
+                             repeat_window=3, time_budget=1.0)
+    _check(plan, 7, 3)
+
+
+def test_repeat_window_keys_on_recipe_id(fixed_scores):
+    cat = _catalog()
+    dinners = cat[cat["meal_type"] == "Dinner"]
+    cat = pd.concat([cat, dinners.nlargest(1, "score")], ignore_index=True)   # listed twice
+    plan = planner.plan_days({}, {}, cat, days=5, bounds=BOUNDS,
+                             repeat_window=3, time_budget=1.0)
+    _check(plan, 5, 3)
+
+
+def test_retries_when_kept_options_are_blocked(fixed_scores):
+    plan = planner.plan_days({}, {}, _catalog(), days=7, bounds=BOUNDS, repeat_window=7,
+                             options_per_day=5, candidates=3, time_budget=1.0)
+    _check(plan, 7, 7)
+
+
+def test_window_bound_proves_optimum(fixed_scores):
+    cat = _catalog(200)
+    plan = planner.plan_days({}, {}, cat, days=7, repeat_window=3, time_budget=5.0)
+    assert plan.attrs["optimal"]
+    _check(plan, 7, 3, bounds={})
+    # unconstrained → each meal cycles its 3 best recipes: 3·a + 2·b + 2·c
+    best = sum(np.dot([3, 2, 2], g.nlargest(3).to_numpy())
+               for _, g in cat.groupby(cat["meal_type"].str.lower())["score"])
+    assert plan.attrs["plan_score"] == pytest.approx(best, abs=1e-3)
+
+
+def test_retry_stops_at_combination_cap(fixed_scores, monkeypatch):
+    calls = []
+    day_options = planner._day_options
+    monkeypatch.setattr(planner, "_day_options", lambda c, *a: calls.append(
+        np.prod([len(x) for x in c])) or day_options(c, *a))
+    plan = planner.plan_days({}, {}, _catalog(12_000), days=3,
+                             bounds={"calories": (5000, None)}, time_budget=30.0)
+    assert plan.empty
+    assert max(calls) <= planner.MAX_COMBOS and len(calls) < 5
+
+
+def test_infeasible_bounds_give_empty_plan(fixed_scores):
+    plan = planner.plan_days({}, {}, _catalog(), days=3,
+                             bounds={"calories": (5000, None)}, time_budget=2.0)
+    assert plan.empty
@@ -0,0 +1,71 @@
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+try:
+    from engine import recommender
+except Exception as e:                     # needs the trained model artifacts
+    pytest.skip(f"engine unavailable: {e}", allow_module_level=True)
+from utils import data_loader
+
+
+FUZZY = {"diet_type": {"balanced": 0.7, "vegan": 0.3}}
+PROFILE = {"age": 30, "height": 170, "weight": 70, "activity_level": "Medium"}
+
+
+def _catalog(n=30_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "recipe_id": np.arange(1, n + 1),
+        "name": [f"recipe {i}" for i in range(n)],
+        "meal_type": rng.choice(["breakfast", "lunch", "dinner"], n),
+        "diet_type": rng.choice(["vegan", "balanced", "high_protein", "low_carb"], n),
+        "prep_time": [f"{m} min" for m in rng.integers(5, 31, n)],
+    })
+    for col in data_loader.NUTRIENTS:
+        df[col] = rng.gamma(2, 60, n).round(0).astype(str)       # coarse → many ties
+    return df
+
+
+def _feedback(catalog, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({**PROFILE, "recipe_id": rng.choice(catalog["recipe_id"], 500),
+                         "satisfaction": rng.integers(1, 6, 500)})
+
+
+@pytest.mark.parametrize("shards", [2, 3, 7])
+def test_sharded_matches_single_pass(shards):
+    raw = _catalog()
+    fb = _feedback(raw)
+    one = recommender.recommend_recipes(PROFILE, FUZZY, raw, fb, top_n=25, shards=1)
+    for cat in (raw, recommender.prepare_catalog(raw)):
+        many = recommender.recommend_recipes(PROFILE, FUZZY, cat, fb, top_n=25, shards=shards)
+        pd.testing.assert_frame_equal(one, many)
+
+
+def test_shards_do_not_parse(monkeypatch):
+    cat = recommender.prepare_catalog(_catalog())
+    def no_parse(s):
+        raise AssertionError("catalog parsed per request")
+    monkeypatch.setattr(recommender, "to_float_series", no_parse)
+    out = recommender.recommend_recipes(PROFILE, FUZZY, cat, top_n=5, shards=4)
+    assert len(out) == 5
+
+
+if __name__ == "__main__":
+    raw = _catalog(200_000)
+    cat = recommender.prepare_catalog(raw)
+    print(f"{os.cpu_count()} CPU(s), {len(raw):,} recipes")
+    for name, frame in (("raw", raw), ("prepared", cat)):
+        for shards in sorted({1, os.cpu_count() or 1}):
+            t0 = time.perf_counter()
+            for _ in range(3):
+                recommender.recommend_recipes(PROFILE, FUZZY, frame, top_n=10, shards=shards)
+            print(f"{name:>8}  shards={shards}  {(time.perf_counter() - t0) / 3 * 1000:7.1f} ms")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Distil the ANFIS preference (AnfisNet + softmax expectation) into a
+lookup‑table student for high‑QPS serving.
+
+• Training pairs: random synthetic profiles × random catalog recipes, labelled
+  by the active teacher.
+• Student: `infer.StudentTable` – profile step tables plus piecewise‑linear
+  nutrient curves, one set per profile bin, fitted by ridge regression on
+  the sparse bin/hat design.  For a fixed profile it is 7 `np.interp` calls.
+• Agreement report on held‑out profiles scoring the catalog: mean Spearman ρ
+  and top‑k overlap against the teacher, and the per‑10k‑rows latency of both.
+• Saves `models/anfis_student.npz`, tagged with the teacher version so a
+  retrained model never gets served by a stale student.
+
+    $ python src/anfis_local/distill.py --pairs 200000 --knots 16
+    $ SMARTDIET_SCORER=student python gui_diet_app.py
+"""
+from pathlib import Path
+import argparse, os, sys, time
+import numpy as np
+from scipy import sparse
+from scipy.stats import spearmanr
+from sklearn.linear_model import Ridge
+
+BASE = Path(__file__).resolve().parents[2]
+for _p in (str(BASE), str(BASE / "src")):
+    if _p not in sys.path: sys.path.insert(0, _p)
+from anfis_local.infer import (ARTIFACTS, MODEL_DIR, PROFILE_DIM, STUDENT_FILE,  # noqa: E402
+                               StudentTable, score_vectors_versioned)
+from utils.data_loader import load_data, recipe_features                        # noqa: E402
+
+SEED  = 42
+PAIRS = 200_000
+BINS  = 8      # step bins per profile feature
+KNOTS = 16     # piecewise‑linear knots per nutrient
+ALPHA = 1e-2
+TOP_K = 10
+
+# ── data ────────────────────────────────────────────
+def sample_profiles(n: int, rng: np.random.Generator) -> np.ndarray:
+    """(n, 4) age, gender_enc, bmi, activity_enc – the ranges the GUI accepts."""
+    return np.column_stack([rng.integers(15, 81, n), rng.integers(0, 2, n),
+                            rng.uniform(16.0, 40.0, n), rng.integers(0, 3, n)]).astype(np.float32)
+
+def teacher(X: np.ndarray) -> np.ndarray:
+    return np.asarray(score_vectors_versioned(X, backend="anfis")[0])
+
+# ── student fit ─────────────────────────────────────
+def _knots(x: np.ndarray, k: int) -> np.ndarray:
+    """k quantile knots (min … max), nudged to be strictly increasing."""
+    kn = np.quantile(x, np.linspace(0, 1, k)).astype(np.float64)
+    for i in range(1, k):
+        kn[i] = max(kn[i], kn[i - 1] + 1e-3)
+    return kn
+
+def _hat(x: np.ndarray, kn: np.ndarray):
+    """Left knot index and weight of the right knot – what `np.interp` does."""
+    j = np.clip(np.searchsorted(kn, x, side="right") - 1, 0, len(kn) - 2)
+    t = np.clip((x - kn[j]) / (kn[j + 1] - kn[j]), 0.0, 1.0)
+    return j, t
+
+def fit_student(X: np.ndarray, y: np.ndarray, bins: int = BINS, knots: int = KNOTS,
+                alpha: float = ALPHA) -> StudentTable:
+    n, d = X.shape
+    P, N = X[:, :PROFILE_DIM], X[:, PROFILE_DIM:].astype(np.float64)
+    dp, dn = PROFILE_DIM, d - PROFILE_DIM
+    qs = np.linspace(0, 1, bins + 1)[1:-1]
+    st = StudentTable(np.stack([np.quantile(P[:, j], qs) for j in range(dp)]).astype(np.float32),
+                      np.stack([_knots(N[:, q], knots) for q in range(dn)]),
+                      None, None, None, 0.0, ARTIFACTS.version)
+    bp = st.profile_bins(P)
+    j, t = zip(*(_hat(N[:, q], st.knots[q]) for q in range(dn)))
+    j, t = np.stack(j, axis=1), np.stack(t, axis=1)                # (n, dn)
+
+    # one‑hot / hat design: profile steps | nutrient curves | per‑bin curves
+    off_n = dp * bins
+    off_i = off_n + dn * knots
+    cols, vals = [np.arange(dp) * bins + bp], [np.ones((n, dp))]
+    for side, w in ((0, 1 - t), (1, t)):
+        cols.append(off_n + np.arange(dn) * knots + j + side); vals.append(w)
+        for p in range(dp):
+            block = (p * dn + np.arange(dn)) * bins + bp[:, [p]]
+            cols.append(off_i + block * knots + j + side); vals.append(w)
+    cols, vals = np.hstack(cols), np.hstack(vals)
+    n_cols = off_i + dp * dn * bins * knots
+    design = sparse.csr_matrix((vals.ravel(), (np.repeat(np.arange(n), cols.shape[1]), cols.ravel())),
+                               shape=(n, n_cols))
+
+    st.bias = float(y.mean())
+    w = Ridge(alpha=alpha, fit_intercept=False, solver="lsqr").fit(design, y - st.bias).coef_
+    st.pmain = w[:off_n].reshape(dp, bins)
+    st.nmain = w[off_n:off_i].reshape(dn, knots)
+    st.inter = w[off_i:].reshape(dp, dn, bins, knots)
+    return st
+
+# ── agreement report ────────────────────────────────
+def _ms_per_10k(fn, X: np.ndarray, reps: int = 5) -> float:
+    X = np.resize(X, (10_000, X.shape[1]))
+    fn(X)
+    t0 = time.perf_counter()
+    for _ in range(reps): fn(X)
+    return (time.perf_counter() - t0) / reps * 1000
+
+def _timing_matrix(nutrients: np.ndarray, profiles: np.ndarray, n: int = 10_000) -> np.ndarray:
+    """n (profile, recipe) rows cycling through both – the mix the latency is quoted for."""
+    if not len(profiles): profiles = sample_profiles(1, np.random.default_rng(SEED))
+    i = np.arange(n)
+    return np.hstack([profiles[i % len(profiles)], nutrients[i % len(nutrients)]]).astype(np.float32)
+
+def agreement(st: StudentTable, nutrients: np.ndarray, profiles: np.ndarray,
+              k: int = TOP_K) -> dict:
+    rho, overlap = [], []
+    for p in profiles:
+        X = np.hstack([np.broadcast_to(p, (len(nutrients), len(p))), nutrients]).astype(np.float32)
+        t, s = teacher(X), st.predict(X)
+        rho.append(spearmanr(t, s).correlation)
+        top_t = np.argsort(-t, kind="stable")[:k]
+        top_s = np.argsort(-s, kind="stable")[:k]
+        overlap.append(len(np.intersect1d(top_t, top_s)) / k)
+    rho = np.asarray(rho, dtype=float)
+    ok = rho[~np.isnan(rho)]
+    X = _timing_matrix(nutrients, profiles)
+    return {"spearman": float(ok.mean()) if len(ok) else float("nan"),
+            "spearman_min": float(ok.min()) if len(ok) else float("nan"),
+            f"top{k}_overlap": float(np.mean(overlap)) if overlap else float("nan"),
+            "teacher_ms_10k": _ms_per_10k(teacher, X), "student_ms_10k": _ms_per_10k(st.predict, X)}
+
+# ── main ────────────────────────────────────────────
+def distill(pairs: int = PAIRS, bins: int = BINS, knots: int = KNOTS, eval_profiles: int = 50,
+            eval_recipes: int = 5000, seed: int = SEED):
+    rng = np.random.default_rng(seed)
+    recipes, _ = load_data()
+    nutrients = recipe_features(recipes)
+
+    X = np.hstack([sample_profiles(pairs, rng),
+                   nutrients[rng.integers(0, len(nutrients), pairs)]]).astype(np.float32)
+    st = fit_student(X, teacher(X), bins, knots)
+
+    sub = nutrients[rng.permutation(len(nutrients))[:eval_recipes]]
+    report = agreement(st, sub, sample_profiles(eval_profiles, rng))
+
+    MODEL_DIR.mkdir(exist_ok=True)
+    out, tmp = MODEL_DIR / STUDENT_FILE, MODEL_DIR / ("tmp_" + STUDENT_FILE)
+    st.save(tmp)
+    os.replace(tmp, out)
+    return st, report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pairs", type=int, default=PAIRS, help="profile × recipe training rows")
+    ap.add_argument("--bins", type=int, default=BINS, help="step bins per profile feature")
+    ap.add_argument("--knots", type=int, default=KNOTS, help="curve knots per nutrient")
+    ap.add_argument("--eval-profiles", type=int, default=50)
+    ap.add_argument("--eval-recipes", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args()
+
+    st, rep = distill(args.pairs, args.bins, args.knots, args.eval_profiles, args.eval_recipes, args.seed)
+    print(f"✅ Student for model {st.teacher_version} saved → {MODEL_DIR / STUDENT_FILE}")
+    print(f"   Spearman ρ {rep['spearman']:.3f} (min {rep['spearman_min']:.3f}), "
+          f"top‑{TOP_K} overlap {rep[f'top{TOP_K}_overlap']:.2%}")
+    print(f"   latency per 10k rows: teacher {rep['teacher_ms_10k']:.2f} ms, "
+          f"student {rep['student_ms_10k']:.2f} ms")
@@ -1,38 +1,306 @@
 #!/usr/bin/env python3
 """
 Local ANFIS satisfaction-inference helpers.
+
+Model + scaler live in an `ArtifactStore`.  A retrained model is rolled out
+without restarting the process by calling `ARTIFACTS.reload()` (or by starting
+`ARTIFACTS.watch()`, which polls `models/manifest.json`).  The new files are
+checksummed, loaded off to the side and swapped in with a single reference
+assignment, so calls already running finish on the version they started with.
+
+If `models/manifest.json` exists it pins the expected sha256 of each file
+(and optionally a `"version"` label); a mismatch rejects the reload.
+`train_satisfaction.py` publishes model and scaler first and the manifest
+last, so the watcher only reacts once a complete pair is in place.
+
+Scoring backend: `SMARTDIET_SCORER=student` (or `backend="student"`) serves
+preferences from the distilled lookup‑table student built by
+`anfis_local/distill.py` – cheaper per request, slightly less faithful.  The student is
+only used while it was distilled from the active model version; otherwise
+the ANFIS teacher answers.
 """
 
+import hashlib
+import io
+import json
+import os
+import threading
 from pathlib import Path
 import numpy as np
 import torch
 import joblib
 
-# -------- load model + scaler once --------
 BASE = Path(__file__).resolve().parents[2]
-SCALER = joblib.load(BASE / "models" / "scaler_satisfaction.pkl")
+MODEL_DIR   = BASE / "models"
+MODEL_FILE  = "anfis_satisfaction.pth"
+SCALER_FILE = "scaler_satisfaction.pkl"
+MANIFEST    = "manifest.json"
+STUDENT_FILE = "anfis_student.npz"
+SCORER_ENV  = "SMARTDIET_SCORER"      # "anfis" (default) | "student"
+PROFILE_DIM = 4      # age, gender, bmi, activity – the rest are recipe nutrients
 
 from models.anfis_diet import AnfisNet
 
-NET = AnfisNet(input_dim=11, output_dim=5)
-NET.load_state_dict(torch.load(BASE / "models" / "anfis_satisfaction.pth", map_location="cpu"))
-NET.eval()
+
+class ArtifactError(RuntimeError):
+    """Artifacts on disk are missing, corrupt or fail checksum verification."""
+
+
+class ArtifactBundle:
+    """One immutable (version, scaler, net) triple."""
+    __slots__ = ("version", "scaler", "net")
+
+    def __init__(self, version: str, scaler, net: AnfisNet):
+        self.version, self.scaler, self.net = version, scaler, net
+
+
+class ArtifactStore:
+    def __init__(self, model_dir: Path = MODEL_DIR):
+        self.model_dir = Path(model_dir)
+        self._lock = threading.Lock()             # serialises reloads only
+        self._watcher = None
+        self._stop = threading.Event()
+        self._active = self._load()
+
+    # -------- loading --------
+    def _load(self) -> ArtifactBundle:
+        blobs = {}
+        for name in (MODEL_FILE, SCALER_FILE):
+            try:
+                blobs[name] = (self.model_dir / name).read_bytes()
+            except OSError as e:
+                raise ArtifactError(f"cannot read {name}: {e}") from e
+        digests = {n: hashlib.sha256(b).hexdigest() for n, b in blobs.items()}
+
+        version = hashlib.sha256("".join(digests[n] for n in sorted(digests)).encode()).hexdigest()[:12]
+        manifest = self.model_dir / MANIFEST
+        if manifest.exists():
+            try:
+                meta = json.loads(manifest.read_text())
+            except (OSError, ValueError) as e:
+                raise ArtifactError(f"cannot read {MANIFEST}: {e}") from e
+            for name, digest in digests.items():
+                if name in meta and meta[name] != digest:
+                    raise ArtifactError(f"checksum mismatch for {name}")
+            version = str(meta.get("version", version))
+
+        try:
+            scaler = joblib.load(io.BytesIO(blobs[SCALER_FILE]))
+            net = AnfisNet(input_dim=11, output_dim=5)
+            net.load_state_dict(torch.load(io.BytesIO(blobs[MODEL_FILE]), map_location="cpu"))
+        except Exception as e:                     # truncated / foreign / mismatched files
+            raise ArtifactError(f"cannot deserialise artifacts: {type(e).__name__}: {e}") from e
+        net.eval()
+        return ArtifactBundle(version, scaler, net)
+
+    @property
+    def active(self) -> ArtifactBundle:
+        return self._active
+
+    @property
+    def version(self) -> str:
+        return self._active.version
+
+    def reload(self, background: bool = False):
+        """
+        Load whatever is on disk and swap it in.  Returns the new version, or
+        the started thread when `background=True`.  On failure the current
+        version stays active and `ArtifactError` is raised (foreground only).
+        """
+        if background:
+            t = threading.Thread(target=self._reload_quietly, daemon=True)
+            t.start()
+            return t
+        with self._lock:
+            bundle = self._load()
+            if bundle.version != self._active.version:
+                self._active = bundle              # atomic swap
+            return self._active.version
+
+    def _reload_quietly(self) -> bool:
+        try:
+            self.reload()
+            return True
+        except Exception as e:
+            print("⚠️ Model reload failed, keeping", self.version, "-", e)
+            return False
+
+    # -------- directory watcher --------
+    def _signature(self):
+        try:
+            st = (self.model_dir / MANIFEST).stat()
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    def watch(self, interval: float = 5.0):
+        """
+        Poll the manifest and reload when it changes – it is written last, so
+        model and scaler are both in place by then.  A failed reload (e.g. a
+        transient read error) is retried on the next tick.
+        """
+        if self._watcher and self._watcher.is_alive():
+            return self._watcher
+        self._stop.clear()
+
+        def loop():
+            seen = self._signature()
+            while not self._stop.wait(interval):
+                sig = self._signature()
+                if sig != seen and self._reload_quietly():
+                    seen = sig
+
+        self._watcher = threading.Thread(target=loop, name="artifact-watch", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop(self):
+        self._stop.set()
+
+
+# -------- load model + scaler once --------
+ARTIFACTS = ArtifactStore()
+
+def _expected_pref(logits: torch.Tensor) -> list[float]:
+    probs = torch.softmax(logits, dim=1)
+    exp   = torch.arange(5, dtype=torch.float32)
+    return ((probs * exp).sum(dim=1) / 4.0).tolist()   # map 0‑4 → 0‑1
+
+# -------- distilled student --------
+class StudentTable:
+    """
+    Additive model: step tables over quantile bins of the 4 profile features,
+    piecewise‑linear curves over quantile knots of the 7 nutrients, and one
+    nutrient curve per (profile feature, profile bin).  For a fixed profile it
+    folds into 7 curves, so scoring a catalog is 7 `np.interp` calls.
+    """
+    def __init__(self, pedges, knots, pmain, nmain, inter, bias, teacher_version):
+        self.pedges, self.knots = pedges, knots     # (4, B‑1), (7, K)
+        self.pmain, self.nmain = pmain, nmain       # (4, B),   (7, K)
+        self.inter = inter                          # (4, 7, B, K)
+        self.bias, self.teacher_version = float(bias), str(teacher_version)
+
+    _FIELDS = ("pedges", "knots", "pmain", "nmain", "inter", "bias", "teacher_version")
+
+    @classmethod
+    def load(cls, path: Path) -> "StudentTable":
+        z = np.load(path)
+        return cls(*(z[f] for f in cls._FIELDS))
+
+    def save(self, path: Path):
+        with open(path, "wb") as f:
+            np.savez(f, **{f: np.asarray(getattr(self, f)) for f in self._FIELDS})
+
+    def profile_bins(self, P: np.ndarray) -> np.ndarray:
+        return np.stack([np.searchsorted(self.pedges[j], P[:, j], side="right")
+                         for j in range(P.shape[1])], axis=1)
+
+    def _fold(self, bins: np.ndarray, N: np.ndarray) -> np.ndarray:
+        p = np.arange(len(bins))
+        curves = self.nmain + self.inter[p, :, bins, :].sum(axis=0)
+        y = self.bias + self.pmain[p, bins].sum()
+        for q, col in enumerate(np.ascontiguousarray(N.T, dtype=np.float64)):
+            y = y + np.interp(col, self.knots[q], curves[q])
+        return y
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        bp, N = self.profile_bins(X[:, :PROFILE_DIM]), X[:, PROFILE_DIM:]
+        if (bp == bp[0]).all():                     # one profile × many recipes
+            return np.clip(self._fold(bp[0], N), 0.0, 1.0)
+        groups, inv = np.unique(bp, axis=0, return_inverse=True)
+        inv = inv.ravel()
+        y = np.empty(len(X))
+        for g, bins in enumerate(groups):
+            rows = np.flatnonzero(inv == g)
+            y[rows] = self._fold(bins, N[rows])
+        return np.clip(y, 0.0, 1.0)
+
+
+_student = {"sig": None, "table": None}
+_student_lock = threading.Lock()
+
+def _backend(backend: str | None) -> str:
+    return (backend or os.environ.get(SCORER_ENV) or "anfis").lower()
+
+def load_student(model_dir: Path = MODEL_DIR) -> StudentTable | None:
+    """Distilled student on disk (re‑read when the file changes), or None."""
+    path = Path(model_dir) / STUDENT_FILE
+    try:
+        st = path.stat(); sig = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+    with _student_lock:
+        if sig != _student["sig"]:
+            try:
+                _student["table"] = StudentTable.load(path)
+            except (OSError, KeyError, ValueError) as e:
+                print("⚠️ Student scorer unreadable -", e)
+                _student["table"] = None
+            _student["sig"] = sig
+        return _student["table"]
+
+def _current_student(bundle: ArtifactBundle) -> StudentTable | None:
+    table = load_student()
+    return table if table is not None and table.teacher_version == bundle.version else None
 
 # -------- public api --------
-def score_vectors(vectors: list[list[float]]) -> list[float]:
+def score_vectors_versioned(vectors, backend: str | None = None) -> tuple[list[float], str]:
+    """`score_vectors` plus the artifact version that produced the scores
+    (suffixed `~student` when the distilled backend answered)."""
+    bundle = ARTIFACTS.active                     # pinned for this call
+    if len(vectors) == 0:
+        return [], bundle.version
+    if _backend(backend) == "student":
+        table = _current_student(bundle)
+        if table is not None:
+            return table.predict(vectors).tolist(), bundle.version + "~student"
+    Xs = bundle.scaler.transform(np.array(vectors, dtype=np.float32))
+    with torch.no_grad():
+        return _expected_pref(bundle.net(torch.tensor(Xs, dtype=torch.float32))), bundle.version
+
+def project_recipes(nutrients: np.ndarray) -> tuple[np.ndarray, str]:
     """
-    vectors : list of 11‑element feature lists.
-    returns : list of floats 0‒1 preference score.
+    Profile‑independent part of the first `AnfisNet` layer for each recipe:
+    (scaled nutrients) @ W_recipe.T + b, shape (n, hidden1).  Computed once per
+    catalog + model version and completed per request by `score_projected`.
+    """
+    bundle = ARTIFACTS.active
+    first = bundle.net.net[0]
+    sc = bundle.scaler
+    xs = (np.asarray(nutrients, dtype=np.float32) - sc.mean_[PROFILE_DIM:]) / sc.scale_[PROFILE_DIM:]
+    with torch.no_grad():
+        W = first.weight[:, PROFILE_DIM:].numpy()
+        b = first.bias.numpy()
+    return (xs.astype(np.float32) @ W.T + b).astype(np.float32), bundle.version
+
+def score_projected(profile_vec: list[float], projection: np.ndarray,
+                    version: str) -> tuple[list[float], str] | None:
+    """
+    Same result as `score_vectors_versioned` on [profile + nutrients] rows,
+    using a `project_recipes` output.  None if `version` is no longer active
+    or the student backend is selected (callers then score the full rows).
     """
-    if not vectors:
-        return []
-    Xs = SCALER.transform(np.array(vectors, dtype=np.float32))
+    bundle = ARTIFACTS.active
+    if version != bundle.version or _backend(None) == "student":
+        return None
+    if len(projection) == 0:
+        return [], bundle.version
+    sc = bundle.scaler
+    ps = (np.asarray(profile_vec, dtype=np.float32) - sc.mean_[:PROFILE_DIM]) / sc.scale_[:PROFILE_DIM]
     with torch.no_grad():
-        logits = NET(torch.tensor(Xs))
-        probs  = torch.softmax(logits, dim=1)
-        exp    = torch.arange(5, dtype=torch.float32)
-        pref   = (probs * exp).sum(dim=1) / 4.0   # map 0‑4 → 0‑1
-    return pref.tolist()
+        first = bundle.net.net[0]
+        offset = first.weight[:, :PROFILE_DIM].numpy() @ ps.astype(np.float32)
+        h = torch.from_numpy(np.asarray(projection, dtype=np.float32) + offset.astype(np.float32))
+        return _expected_pref(bundle.net.net[1:](h)), bundle.version
+
+def score_vectors(vectors: list[list[float]], backend: str | None = None) -> list[float]:
+    """
+    vectors : list of 11‑element feature lists (or an (n, 11) array).
+    backend : "anfis" | "student"; default from $SMARTDIET_SCORER, else "anfis".
+    returns : list of floats 0‒1 preference score.
+    """
+    return score_vectors_versioned(vectors, backend)[0]
 
 def infer_single(vec: list[float]) -> float:
     """Convenience wrapper for a single 11‑feature vector."""
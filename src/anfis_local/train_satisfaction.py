@@ -7,46 +7,71 @@ Train satisfaction classifier (11 GUI features) with **early stopping**.
 • Class imbalance handled with `class_weight="balanced"`.
 • Logs every 5 epochs, stops automatically when validation accuracy hasn’t
   improved for **8 consecutive checks**.
-• Saves the **best** model and the scaler.
+• Publishes the **best** model and its scaler together: both are staged in
+  `models/.staging/`, moved in, and `models/manifest.json` (their sha256 –
+  what `ArtifactStore` verifies and `watch()` follows) is replaced last, so a
+  running app never loads a model with another run's scaler.
+• `--stream` trains out of core: the feedback file is read in fixed‑size
+  chunks (CSV, or Parquet if pyarrow is installed), the scaler is fitted in one
+  pass with running statistics, training batches come from a shuffle buffer
+  and validation is a stratified reservoir – peak memory no longer depends on
+  the size of the feedback log.
+• `--augment K` skips the CSV altogether: the rated recipes from the raw
+  Food.com files are each paired with K fresh synthetic profiles per epoch,
+  drawn batch by batch with a seeded `numpy.random.Generator` (same sampler
+  as `build_training_data.py`) – reproducible, nothing written to disk.
+• `--compacted` reads the feedback rollup (`utils.feedback_store`) instead of
+  the raw log: each row is `count` identical rated events, so rows are drawn
+  and validated with `count` as weight – same data, a fraction of the I/O.
+• Default data: the synthetic `data/training_dataset.csv` plus the rated rows
+  of the live log `data/user_feedback.csv`; `--data` takes any list of files,
+  missing ones are skipped.
 
 Run inside `venv_anfis`:
     $ source venv_anfis/bin/activate
     $ python src/anfis/train_satisfaction.py
+    $ python src/anfis/train_satisfaction.py --stream --chunk 50000
+    $ python src/anfis/train_satisfaction.py --augment 32
+    $ python src/anfis/train_satisfaction.py --compacted
 """
 
 from pathlib import Path
-import sys, joblib, numpy as np, pandas as pd, torch
+import argparse, hashlib, json, os, shutil, sys, time, joblib, numpy as np, pandas as pd, torch
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.utils.class_weight import compute_class_weight
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import DataLoader, IterableDataset, TensorDataset, WeightedRandomSampler
 
 # ── paths & imports ─────────────────────────────────
 BASE = Path(__file__).resolve().parents[2]
 sys.path.append(str(BASE))
 from models.anfis_diet import AnfisNet  # noqa: E402
+import build_training_data as btd       # noqa: E402
 
 # ── hyper‑params ───────────────────────────────────
-SEED      = 42
+SEED      = int(os.environ.get("SMARTDIET_SEED", 42))
 MAX_EPOCH = 120
 BATCH     = 128
 LR        = 1e-4
 PATIENCE  = 8      # early‑stop patience (×5‑epoch checks)
+N_CLASSES = 5
 
-np.random.seed(SEED)
-torch.manual_seed(SEED)
+# streaming mode
+CHUNK       = 50_000    # rows read per chunk
+SHUFFLE_BUF = 20_000    # rows mixed before batching
+VAL_FRAC    = 0.2       # share of rows held out from training
+VAL_MAX     = 20_000    # validation rows kept (stratified)
 
-# ── load data ──────────────────────────────────────
-df = pd.read_csv(BASE / "data" / "user_feedback.csv")
-df["satisfaction"] = pd.to_numeric(df["satisfaction"], errors="coerce")
-df = df[df["satisfaction"].between(1, 5)]
-df["satisfaction"] = df["satisfaction"].astype(int) - 1
+# augmented mode
+PER_RECIPE  = 32        # synthetic profiles per recipe per epoch
+VAL_PER_RECIPE = 4      # fixed profiles per held‑out recipe
 
-# feature engineering
-activity_map       = {"Low": 0, "Medium": 1, "High": 2}
-df["gender_enc"]   = (df["gender"].str.upper() == "M").astype(int)
-df["activity_enc"] = df["activity_level"].map(activity_map).fillna(1).astype(int)
-df["bmi"]          = (df["weight"] / ((df["height"] / 100) ** 2)).clip(0)
+FEEDBACK  = BASE / "data" / "user_feedback.csv"        # live log the GUI appends to
+DATASET   = BASE / "data" / "training_dataset.csv"     # build_training_data.py
+DATA      = [DATASET, FEEDBACK]
+RAW_DIR   = BASE / "data"
+MODEL_DIR = BASE / "models"
+MODEL_FILE, SCALER_FILE, MANIFEST = "anfis_satisfaction.pth", "scaler_satisfaction.pkl", "manifest.json"
 
 FEATS = [
     "age", "gender_enc", "bmi", "activity_enc",
@@ -54,54 +79,312 @@ FEATS = [
     "protein", "saturated_fat", "carbs",
 ]
 
-X = df[FEATS].fillna(0).values.astype("float32")
-y = df["satisfaction"].values.astype("int64")
+np.random.seed(SEED)
+torch.manual_seed(SEED)
+
+# ── feature engineering ────────────────────────────
+def make_xy(df: pd.DataFrame, weighted: bool = False):
+    """
+    Feedback rows → (X float32, y int64 0‑4); rows without a 1‑5 rating dropped.
+    `weighted` also returns each row's event `count` (1 for raw rows).
+    """
+    df = df.copy()
+    df["satisfaction"] = pd.to_numeric(df["satisfaction"], errors="coerce")
+    df = df[df["satisfaction"].between(1, 5)]
+    df["satisfaction"] = df["satisfaction"].astype(int) - 1
 
-X_train_raw, X_val_raw, y_train, y_val = train_test_split(
-    X, y, test_size=0.2, stratify=y, random_state=SEED
-)
+    activity_map       = {"Low": 0, "Medium": 1, "High": 2}
+    df["gender_enc"]   = (df["gender"].str.upper() == "M").astype(int)
+    df["activity_enc"] = df["activity_level"].map(activity_map).fillna(1).astype(int)
+    df["bmi"]          = (df["weight"] / ((df["height"] / 100) ** 2)).clip(0)
 
-# scaler
-scaler = StandardScaler().fit(X_train_raw)
-X_train = scaler.transform(X_train_raw).astype("float32")
-X_val   = scaler.transform(X_val_raw).astype("float32")
+    X = df[FEATS].fillna(0).values.astype("float32")
+    y = df["satisfaction"].values.astype("int64")
+    if weighted:
+        w = (df["count"].fillna(1).to_numpy("float64") if "count" in df.columns
+             else np.ones(len(df)))
+        return X, y, w
+    return X, y
 
-MODEL_DIR = BASE / "models"
-MODEL_DIR.mkdir(exist_ok=True)
-joblib.dump(scaler, MODEL_DIR / "scaler_satisfaction.pkl")
-
-# dataloaders
-train_loader = DataLoader(TensorDataset(torch.tensor(X_train), torch.tensor(y_train)),
-                         batch_size=BATCH, shuffle=True)
-val_tensor   = torch.tensor(X_val)
-val_target   = torch.tensor(y_val)
-
-# model + loss
-net   = AnfisNet(input_dim=len(FEATS), output_dim=5)
-weights = compute_class_weight("balanced", classes=np.unique(y_train), y=y_train)
-loss_fn = torch.nn.CrossEntropyLoss(weight=torch.tensor(weights, dtype=torch.float32))
-opt    = torch.optim.Adam(net.parameters(), lr=LR)
-
-# early‑stop loop
-best_acc, no_improve = 0.0, 0
-for epoch in range(1, MAX_EPOCH + 1):
-    net.train()
-    for xb, yb in train_loader:
-        opt.zero_grad(); loss_fn(net(xb), yb).backward(); opt.step()
-
-    if epoch == 1 or epoch % 5 == 0:
-        net.eval()
-        with torch.no_grad():
-            preds = torch.argmax(net(val_tensor), 1)
-            acc   = (preds == val_target).float().mean().item() * 100
-        print(f"epoch {epoch:3d}  val acc {acc:.2f}%")
-        if acc > best_acc:
-            best_acc = acc
-            no_improve = 0
-            torch.save(net.state_dict(), MODEL_DIR / "anfis_satisfaction.pth")
-        else:
-            no_improve += 5
-        if no_improve >= PATIENCE:
-            break
-
-print(f"Best validation accuracy kept: {best_acc:.2f}% (model saved)")
+# ── publishing ─────────────────────────────────────
+def publish(state_dict, scaler, model_dir: Path = MODEL_DIR) -> str:
+    """Stage model + scaler, move both in, then swap the manifest; returns the version."""
+    model_dir = Path(model_dir)
+    stage = model_dir / ".staging"
+    shutil.rmtree(stage, ignore_errors=True); stage.mkdir(parents=True)
+    torch.save(state_dict, stage / MODEL_FILE)
+    joblib.dump(scaler, stage / SCALER_FILE)
+    meta = {n: hashlib.sha256((stage / n).read_bytes()).hexdigest() for n in (MODEL_FILE, SCALER_FILE)}
+    version = hashlib.sha256("".join(meta[n] for n in sorted(meta)).encode()).hexdigest()[:12]
+    meta.update(version=version, published=time.strftime("%Y-%m-%d %H:%M:%S"))
+    (stage / MANIFEST).write_text(json.dumps(meta, indent=1))
+    for name in (MODEL_FILE, SCALER_FILE, MANIFEST):          # manifest last
+        os.replace(stage / name, model_dir / name)
+    stage.rmdir()
+    return version
+
+# ── early‑stop loop (shared by all modes) ──────────
+def fit(train_loader, val_tensor, val_target, class_weights, scaler, val_weight=None):
+    net   = AnfisNet(input_dim=len(FEATS), output_dim=N_CLASSES)
+    loss_fn = torch.nn.CrossEntropyLoss(weight=torch.tensor(class_weights, dtype=torch.float32))
+    opt    = torch.optim.Adam(net.parameters(), lr=LR)
+
+    best_acc, best_state, no_improve = 0.0, None, 0
+    for epoch in range(1, MAX_EPOCH + 1):
+        net.train()
+        for xb, yb in train_loader:
+            opt.zero_grad(); loss_fn(net(xb), yb).backward(); opt.step()
+
+        if epoch == 1 or epoch % 5 == 0:
+            net.eval()
+            with torch.no_grad():
+                preds = torch.argmax(net(val_tensor), 1)
+                hit   = (preds == val_target).float()
+                acc   = (hit.mean().item() if val_weight is None
+                         else float((hit * val_weight).sum() / val_weight.sum())) * 100
+            print(f"epoch {epoch:3d}  val acc {acc:.2f}%")
+            if acc > best_acc:
+                best_acc = acc
+                no_improve = 0
+                best_state = {k: v.detach().clone() for k, v in net.state_dict().items()}
+            else:
+                no_improve += 5
+            if no_improve >= PATIENCE:
+                break
+    if best_state is None: best_state = net.state_dict()
+    print(f"🚀 Published model version {publish(best_state, scaler)}")
+    return best_acc
+
+def _existing(paths) -> list[Path]:
+    found = [Path(p) for p in paths if Path(p).exists()]
+    if not found: sys.exit(f"❌ No training data in {', '.join(map(str, paths))}")
+    return found
+
+# ── in‑memory mode ─────────────────────────────────
+def train_in_memory(paths=DATA):
+    X, y = make_xy(pd.concat([pd.read_csv(p) for p in _existing(paths)], ignore_index=True))
+
+    X_train_raw, X_val_raw, y_train, y_val = train_test_split(
+        X, y, test_size=0.2, stratify=y, random_state=SEED
+    )
+
+    # scaler
+    scaler = StandardScaler().fit(X_train_raw)
+    X_train = scaler.transform(X_train_raw).astype("float32")
+    X_val   = scaler.transform(X_val_raw).astype("float32")
+
+    # dataloaders
+    train_loader = DataLoader(TensorDataset(torch.tensor(X_train), torch.tensor(y_train)),
+                             batch_size=BATCH, shuffle=True)
+    weights = compute_class_weight("balanced", classes=np.unique(y_train), y=y_train)
+    return fit(train_loader, torch.tensor(X_val), torch.tensor(y_val), weights, scaler)
+
+# ── compacted mode ─────────────────────────────────
+def train_compacted(paths=DATA):
+    """The live log comes from its rollup; other files are read as one event per row."""
+    if str(BASE / "src") not in sys.path: sys.path.insert(0, str(BASE / "src"))
+    from utils import feedback_store
+    frames = [feedback_store.read(p) if p.resolve() == feedback_store.RAW_LOG.resolve()
+              else pd.read_csv(p) for p in _existing(paths)]
+    X, y, w = make_xy(pd.concat(frames, ignore_index=True), weighted=True)
+
+    tr, va = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=SEED)
+    scaler = StandardScaler().fit(X[tr], sample_weight=w[tr])
+    X_train = scaler.transform(X[tr]).astype("float32")
+    X_val   = scaler.transform(X[va]).astype("float32")
+
+    # rows drawn in proportion to their event count ≈ one raw‑log epoch
+    sampler = WeightedRandomSampler(torch.tensor(w[tr]), int(round(w[tr].sum())),
+                                    generator=torch.Generator().manual_seed(SEED))
+    train_loader = DataLoader(TensorDataset(torch.tensor(X_train), torch.tensor(y[tr])),
+                              batch_size=BATCH, sampler=sampler)
+    counts = np.bincount(y[tr], weights=w[tr], minlength=N_CLASSES)
+    present = counts > 0
+    weights = np.zeros(N_CLASSES)
+    weights[present] = counts.sum() / (present.sum() * counts[present])
+    print(f"📦 {len(y):,} compacted rows = {w.sum():,.0f} rated events")
+    return fit(train_loader, torch.tensor(X_val), torch.tensor(y[va]), weights, scaler,
+               torch.tensor(w[va], dtype=torch.float32))
+
+# ── streaming mode ─────────────────────────────────
+def read_chunks(paths, chunk: int = CHUNK):
+    """(X, y) per fixed‑size chunk of each feedback file in turn."""
+    for path in _existing(paths):
+        yield from _file_chunks(path, chunk)
+
+def _file_chunks(path: Path, chunk: int):
+    if Path(path).suffix == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("❌ Reading Parquet needs pyarrow (pip install pyarrow).")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk):
+            yield make_xy(batch.to_pandas())
+    else:
+        for df in pd.read_csv(path, chunksize=chunk):
+            yield make_xy(df)
+
+def _holdout(i: int, n: int) -> np.ndarray:
+    """Deterministic per‑chunk validation draw, identical in every pass."""
+    return np.random.default_rng([SEED, i]).random(n) < VAL_FRAC
+
+class StratifiedReservoir:
+    """Uniform sample of at most VAL_MAX rows per class; trimmed to class shares."""
+    def __init__(self, cap: int = VAL_MAX, seed: int = SEED):
+        self.cap, self.rng = cap, np.random.default_rng(seed)
+        self.X = [np.empty((0, len(FEATS)), np.float32) for _ in range(N_CLASSES)]
+        self.seen = np.zeros(N_CLASSES, dtype=np.int64)
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        for c in range(N_CLASSES):
+            Xc = X[y == c]
+            if not len(Xc): continue
+            room = self.cap - len(self.X[c])
+            if room > 0:
+                self.X[c] = np.vstack([self.X[c], Xc[:room]])
+                self.seen[c] += min(room, len(Xc)); Xc = Xc[room:]
+            if len(Xc):                                  # Algorithm R, vectorised
+                seen = self.seen[c] + np.arange(1, len(Xc) + 1)
+                j = (self.rng.random(len(Xc)) * seen).astype(np.int64)
+                hit = j < self.cap
+                self.X[c][j[hit]] = Xc[hit]              # later rows win, as sequentially
+                self.seen[c] += len(Xc)
+
+    def sample(self):
+        total = self.seen.sum()
+        budget = min(self.cap, total)                    # keep[c] ≤ rows held for c
+        keep = np.floor(budget * self.seen / max(total, 1)).astype(int)
+        X = np.vstack([self.X[c][self.rng.permutation(len(self.X[c]))[:keep[c]]]
+                       for c in range(N_CLASSES)])
+        y = np.concatenate([np.full(keep[c], c) for c in range(N_CLASSES)])
+        return X, y.astype("int64")
+
+class FeedbackStream(IterableDataset):
+    """Scaled training batches from the chunked file via a shuffle buffer."""
+    def __init__(self, paths, scaler, chunk: int = CHUNK):
+        self.paths, self.scaler, self.chunk = paths, scaler, chunk
+        self.epoch = 0
+
+    @staticmethod
+    def _batches(X, y):
+        for s in range(0, len(X), BATCH):
+            yield torch.from_numpy(X[s:s + BATCH]), torch.from_numpy(y[s:s + BATCH])
+
+    def __iter__(self):
+        rng = np.random.default_rng([SEED, self.epoch]); self.epoch += 1
+        bx, by = np.empty((0, len(FEATS)), np.float32), np.empty(0, np.int64)
+        for i, (X, y) in enumerate(read_chunks(self.paths, self.chunk)):
+            train = ~_holdout(i, len(X))
+            Xs = self.scaler.transform(X[train]).astype("float32")
+            bx, by = np.vstack([bx, Xs]), np.concatenate([by, y[train]])
+            if len(bx) >= SHUFFLE_BUF:
+                perm = rng.permutation(len(bx))
+                out, keep = perm[:-(SHUFFLE_BUF // 2)], perm[-(SHUFFLE_BUF // 2):]
+                n_out = len(out) - len(out) % BATCH      # only full batches mid‑stream
+                out, keep = out[:n_out], np.concatenate([keep, out[n_out:]])
+                yield from self._batches(bx[out], by[out])
+                bx, by = bx[keep], by[keep]
+        perm = rng.permutation(len(bx))
+        yield from self._batches(bx[perm], by[perm])
+
+def train_streaming(paths=DATA, chunk: int = CHUNK):
+    # pass 1: running scaler stats, class counts, validation reservoir
+    scaler = StandardScaler()
+    reservoir = StratifiedReservoir()
+    train_counts = np.zeros(N_CLASSES, dtype=np.int64)
+    for i, (X, y) in enumerate(read_chunks(paths, chunk)):
+        if not len(X): continue
+        scaler.partial_fit(X)
+        held = _holdout(i, len(X))
+        reservoir.add(X[held], y[held])
+        train_counts += np.bincount(y[~held], minlength=N_CLASSES)
+
+    X_val, y_val = reservoir.sample()
+    present = train_counts > 0
+    weights = np.zeros(N_CLASSES)
+    weights[present] = train_counts.sum() / (present.sum() * train_counts[present])
+    print(f"📦 {train_counts.sum():,} training rows streamed, {len(y_val):,} validation rows kept")
+
+    loader = DataLoader(FeedbackStream(paths, scaler, chunk), batch_size=None)
+    val_tensor = torch.tensor(scaler.transform(X_val).astype("float32"))
+    return fit(loader, val_tensor, torch.tensor(y_val), weights, scaler)
+
+# ── augmented mode ─────────────────────────────────
+def encode_profiles(prof: dict) -> np.ndarray:
+    """`btd.sample_profiles` columns → (n, 4) age, gender_enc, bmi, activity_enc (as make_xy)."""
+    act = prof["activity_level"]
+    bmi = np.clip(prof["weight"] / (prof["height"] / 100) ** 2, 0, None)
+    return np.column_stack([prof["age"], prof["gender"] == "M", bmi,
+                            (act == "Medium") + 2 * (act == "High")]).astype("float32")
+
+def augmented_rows(nutrients, labels, rows, per_recipe, rng):
+    """(X, y) for every recipe in `rows` × `per_recipe` newly drawn profiles."""
+    r = np.repeat(rows, per_recipe)
+    X = np.hstack([encode_profiles(btd.sample_profiles(len(r), rng)), nutrients[r]])
+    return X, labels[r]
+
+class ProfileAugmented(IterableDataset):
+    """Scaled batches of (recipe, fresh synthetic profile) pairs, generated per batch."""
+    def __init__(self, nutrients, labels, rows, scaler, per_recipe: int = PER_RECIPE):
+        self.nutrients, self.labels, self.rows = nutrients, labels, rows
+        self.mu, self.sd = scaler.mean_.astype("float32"), scaler.scale_.astype("float32")
+        self.per_recipe, self.epoch = per_recipe, 0
+
+    def __iter__(self):
+        rng = np.random.default_rng([SEED, 1, self.epoch]); self.epoch += 1
+        order = rng.permutation(np.repeat(self.rows, self.per_recipe))
+        for s in range(0, len(order), BATCH):
+            r = order[s:s + BATCH]
+            X, y = augmented_rows(self.nutrients, self.labels, r, 1, rng)
+            yield torch.from_numpy((X - self.mu) / self.sd), torch.from_numpy(y)
+
+def train_augmented(raw_dir: Path = RAW_DIR, per_recipe: int = PER_RECIPE):
+    recipes = btd.load_recipes(raw_dir)
+    recipes = recipes[recipes["satisfaction"].between(1, 5)]
+    nutrients = recipes[btd.nut_cols].to_numpy("float32")
+    labels = (recipes["satisfaction"].astype(int) - 1).to_numpy("int64")
+
+    train_rows, val_rows = train_test_split(
+        np.arange(len(labels)), test_size=0.2, stratify=labels, random_state=SEED
+    )
+    X_val, y_val = augmented_rows(nutrients, labels, val_rows, VAL_PER_RECIPE,
+                                  np.random.default_rng([SEED, 0]))
+    X_fit, _ = augmented_rows(nutrients, labels, train_rows, VAL_PER_RECIPE,
+                              np.random.default_rng([SEED, 2]))
+    scaler = StandardScaler().fit(X_fit)
+
+    weights = compute_class_weight("balanced", classes=np.unique(labels[train_rows]),
+                                   y=labels[train_rows])
+    print(f"📦 {len(train_rows):,} training recipes × {per_recipe} profiles/epoch, "
+          f"{len(y_val):,} validation rows")
+    loader = DataLoader(ProfileAugmented(nutrients, labels, train_rows, scaler, per_recipe),
+                        batch_size=None)
+    val_tensor = torch.tensor(scaler.transform(X_val).astype("float32"))
+    return fit(loader, val_tensor, torch.tensor(y_val), weights, scaler)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", type=Path, nargs="+", default=DATA,
+                    help="feedback files to train on (missing ones are skipped)")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--stream", action="store_true", help="out‑of‑core training")
+    mode.add_argument("--augment", type=int, metavar="K",
+                      help="train on K synthetic profiles per raw recipe per epoch")
+    mode.add_argument("--compacted", action="store_true",
+                      help="train on the compacted feedback store (count‑weighted)")
+    ap.add_argument("--chunk", type=int, default=CHUNK)
+    ap.add_argument("--raw-dir", type=Path, default=RAW_DIR,
+                    help="folder with RAW_recipes.csv + RAW_interactions.csv (--augment)")
+    args = ap.parse_args()
+
+    MODEL_DIR.mkdir(exist_ok=True)
+    if args.augment:
+        best_acc = train_augmented(args.raw_dir, args.augment)
+    elif args.stream:
+        best_acc = train_streaming(args.data, args.chunk)
+    elif args.compacted:
+        best_acc = train_compacted(args.data)
+    else:
+        best_acc = train_in_memory(args.data)
+    print(f"Best validation accuracy kept: {best_acc:.2f}% (model published)")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Precomputed `plan_day` tables for quantised profile buckets.
+
+Profile inputs are coarse, so most requests fall into one of a few thousand
+(age band, BMI band, activity, gender, satiety) buckets.  `build()` plans a
+representative profile for every bucket across a process pool and stores the
+top‑k recipe ids + scores per meal in one .npz (dense, indexed by the
+bucket's mixed‑radix code).  `BucketTable.plan_day()` answers with an O(1)
+array lookup and returns None for outliers or when the table is stale
+(model version or catalog fingerprint changed) – callers then score live.
+
+    $ python src/engine/bucket_cache.py --workers 8
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+SRC = Path(__file__).resolve().parents[1]
+for _p in (str(SRC), str(SRC.parent)):
+    if _p not in sys.path: sys.path.insert(0, _p)
+
+from utils.data_loader import BASE_DIR, compute_bmi, load_data, recipe_features  # noqa: E402
+from utils.shared_features import attach, catalog_fingerprint                     # noqa: E402
+from engine import recommender                                                    # noqa: E402
+from engine.recommender import MEALS                                              # noqa: E402
+from anfis_local.infer import ARTIFACTS                                           # noqa: E402
+
+TABLE_FILE = Path(BASE_DIR) / "data" / "cache" / "bucket_plans.npz"
+
+# ───────── bucket grid ─────────
+AGE_EDGES = np.arange(15, 85, 5)                 # [15,20) … [75,80]
+BMI_EDGES = np.arange(14.0, 41.0, 1.0)           # [14,15) … [39,40]
+ACTIVITY  = ["Low", "Medium", "High"]
+SATIETY   = list(range(0, 6))
+GENDER    = ["M", "F"]
+REP_HEIGHT = 170                                 # cm, representative profile
+DIMS = (len(AGE_EDGES) - 1, len(BMI_EDGES) - 1, len(ACTIVITY), len(GENDER), len(SATIETY))
+N_BUCKETS = int(np.prod(DIMS))
+
+
+def bucket_of(profile: Dict[str, Any]) -> Optional[int]:
+    """Mixed‑radix bucket code, or None if the profile falls outside the grid."""
+    try:
+        bmi = compute_bmi(profile["weight"], profile["height"])
+        a = int(np.searchsorted(AGE_EDGES, profile["age"], side="right")) - 1
+        b = int(np.searchsorted(BMI_EDGES, bmi, side="right")) - 1
+        if profile["age"] == AGE_EDGES[-1]: a = DIMS[0] - 1
+        parts = (a, b, ACTIVITY.index(profile["activity_level"]),
+                 GENDER.index(str(profile.get("gender", "M")).upper()),
+                 SATIETY.index(int(profile.get("satiety", 3))))
+    except (ValueError, KeyError, ZeroDivisionError, TypeError):
+        return None
+    if not (0 <= a < DIMS[0] and 0 <= b < DIMS[1]): return None
+    return int(np.ravel_multi_index(parts, DIMS))
+
+
+def representative(code: int) -> Dict[str, Any]:
+    a, b, act, g, sat = np.unravel_index(code, DIMS)
+    age = int(AGE_EDGES[a] + AGE_EDGES[a + 1]) // 2
+    bmi = (BMI_EDGES[b] + BMI_EDGES[b + 1]) / 2
+    return {"age": age, "height": REP_HEIGHT, "weight": round(bmi * (REP_HEIGHT / 100) ** 2, 1),
+            "activity_level": ACTIVITY[act], "satiety": SATIETY[sat], "gender": GENDER[g]}
+
+
+def _catalog_key(recipes_df: pd.DataFrame) -> str:
+    return catalog_fingerprint(recipes_df["recipe_id"].to_numpy(), recipe_features(recipes_df))
+
+
+# ───────── build ─────────
+_W: Dict[str, Any] = {}
+
+def _init_worker():
+    from fuzzy_logic import rules
+    recipes, _ = load_data()
+    features = attach()
+    catalog = recommender.prepare_catalog(recipes, features)
+    del recipes                                          # one catalog copy per worker
+    _W["session"], _W["rules"] = recommender.RecommendSession(catalog, features), rules
+
+
+def _plan_codes(codes: np.ndarray, k: int):
+    """Top‑k per meal for each bucket code (worker side)."""
+    import contextlib, io
+    rules, sess = _W["rules"], _W["session"]
+    ids = np.full((len(codes), len(MEALS), k), -1, dtype=np.int64)
+    scores = np.full((len(codes), len(MEALS), k), np.nan, dtype=np.float32)
+    for i, code in enumerate(codes):
+        p = representative(int(code))
+        try:                                             # same fallback as the GUI
+            rules.get_fuzzy_memberships(p, compute_bmi(p["weight"], p["height"]))
+            with contextlib.redirect_stdout(io.StringIO()):
+                fz = rules.get_fuzzy_output(); assert "diet_type" in fz
+        except Exception:
+            fz = {"diet_type": {"balanced": 1.0}}
+        plan = sess.plan_day(p, fz, per_session=k)
+        for m, meal in enumerate(MEALS):
+            rows = plan[plan["meal_type"] == meal.title()] if not plan.empty else plan
+            n = len(rows)
+            ids[i, m, :n] = rows["recipe_id"].to_numpy()
+            scores[i, m, :n] = rows["score"].to_numpy()
+    return codes, ids, scores
+
+
+def build(out: Path = TABLE_FILE, k: int = 3, workers: Optional[int] = None,
+          chunk: int = 256) -> dict:
+    recipes, _ = load_data()
+    # satiety (not an ANFIS input) is the innermost radix → consecutive codes
+    # share the ANFIS inputs and RecommendSession only re‑blends between them
+    codes = np.arange(N_BUCKETS)
+    chunk = max(DIMS[-1], chunk - chunk % DIMS[-1])      # whole satiety runs per task
+    ids = np.full((N_BUCKETS, len(MEALS), k), -1, dtype=np.int64)
+    scores = np.full((N_BUCKETS, len(MEALS), k), np.nan, dtype=np.float32)
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        futs = [pool.submit(_plan_codes, codes[s:s + chunk], k)
+                for s in range(0, N_BUCKETS, chunk)]
+        for f in futs:
+            c, i, sc = f.result()
+            ids[c], scores[c] = i, sc
+
+    meta = {"model_version": ARTIFACTS.version, "catalog": _catalog_key(recipes),
+            "k": k, "dims": list(DIMS), "built": time.strftime("%Y-%m-%d %H:%M:%S")}
+    out = Path(out); out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.stem + ".tmp.npz")
+    np.savez_compressed(tmp, ids=ids, scores=scores, meta=np.array(json.dumps(meta)))
+    os.replace(tmp, out)
+    return meta
+
+
+# ───────── serve ─────────
+class BucketTable:
+    def __init__(self, recipes_df: pd.DataFrame, path: Path = TABLE_FILE):
+        z = np.load(path)
+        self.ids, self.scores = z["ids"], z["scores"]
+        self.meta = json.loads(str(z["meta"]))
+        self.df = recommender._prepare(recipes_df)
+        if not recipes_df.attrs.get("prepared"): self.df = self.df.reset_index(drop=True)
+        self._pos = pd.Series(np.arange(len(self.df)), index=self.df["recipe_id"].to_numpy())
+        self.catalog_ok = (self.meta["catalog"] == _catalog_key(recipes_df)
+                           and list(self.meta["dims"]) == list(DIMS))
+
+    @property
+    def fresh(self) -> bool:
+        return self.catalog_ok and self.meta["model_version"] == ARTIFACTS.version
+
+    def plan_day(self, profile: Dict[str, Any], per_session: int = 3) -> Optional[pd.DataFrame]:
+        """Precomputed plan for the profile's bucket; None → score live."""
+        code = bucket_of(profile)
+        if code is None or not self.fresh or per_session > self.meta["k"]: return None
+        parts = []
+        for m, meal in enumerate(MEALS):
+            ids = self.ids[code, m, :per_session]
+            keep = ids >= 0
+            if not keep.any(): continue
+            pos = self._pos.reindex(ids[keep]).to_numpy()
+            if np.isnan(pos).any(): return None
+            parts.append(self.df.iloc[pos.astype(int)].assign(
+                score=self.scores[code, m, :per_session][keep].astype(float).round(3),
+                model_version=self.meta["model_version"], meal_type=meal.title()))
+        out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        out.attrs.pop("shared", None)                    # re‑indexed: rows no longer by label
+        return out
+
+
+def load_table(recipes_df: pd.DataFrame, path: Path = TABLE_FILE) -> Optional[BucketTable]:
+    try:
+        return BucketTable(recipes_df, path)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Precompute plan_day for every profile bucket.")
+    ap.add_argument("--out", type=Path, default=TABLE_FILE)
+    ap.add_argument("--k", type=int, default=3, help="recipes kept per meal")
+    ap.add_argument("--workers", type=int)
+    args = ap.parse_args()
+    t0 = time.time()
+    meta = build(args.out, args.k, args.workers)
+    print(f"✅ {N_BUCKETS:,} buckets in {time.time() - t0:.1f}s → {args.out} "
+          f"(model {meta['model_version']}, catalog {meta['catalog']})")
@@ -0,0 +1,124 @@
+"""
+Inverted ingredient index for allergen/exclusion filtering and search.
+
+Built once per catalog: every ingredient line of every recipe gets an id, and
+every normalised token (lower‑case word, naive singular) maps to a sorted
+int32 posting list of the ingredient ids it occurs in.  A query word matches
+its own token plus the one‑word compounds listed for it in `COMPOUNDS`
+("milk" → buttermilk, "nut" → walnut, peanut); plain substrings never match,
+so "egg" leaves eggplant alone and "corn" peppercorns.  A multi‑word term
+must match inside one ingredient ("peanut butter" is not peanuts + butter
+from two lines).  Resolving a term costs O(postings touched); the mask itself
+is one bool array over the catalog.  It is applied before scoring, e.g.
+
+    mask = index.mask(exclude=["peanut", "milk"])
+    plan_day(profile, fz, recipes_df, mask=mask)
+"""
+from __future__ import annotations
+import ast
+import re
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+_WORD = re.compile(r"[a-z]+")
+
+# one‑word compounds that are a kind of the word (normalised tokens)
+COMPOUNDS: Dict[str, tuple[str, ...]] = {
+    "nut":   ("walnut", "peanut", "hazelnut", "chestnut", "coconut"),
+    "milk":  ("buttermilk",),
+    "egg":   ("eggnog",),
+    "pea":   ("chickpea",),
+    "fish":  ("shellfish", "catfish", "swordfish", "monkfish", "whitefish"),
+    "berry": ("strawberry", "blueberry", "raspberry", "blackberry", "cranberry",
+              "gooseberry", "elderberry", "mulberry"),
+    "seed":  ("flaxseed", "linseed", "hempseed"),
+    "corn":  ("popcorn",),
+    "meal":  ("oatmeal", "cornmeal"),
+    "bread": ("cornbread", "flatbread", "gingerbread", "shortbread"),
+}
+
+
+def normalise(word: str) -> str:
+    """'Tomatoes' → 'tomato', 'eggs' → 'egg'; keeps 'glass', 'hummus'."""
+    w = word.lower()
+    if len(w) > 4 and w.endswith("oes"): return w[:-2]
+    if len(w) > 4 and w.endswith("ies"): return w[:-3] + "y"
+    if len(w) > 3 and w.endswith("s") and not w.endswith(("ss", "us")): return w[:-1]
+    return w
+
+
+def _ingredients(raw) -> list[str]:
+    """Food.com stores "['a', 'b']"; the PP build joins with commas."""
+    if not isinstance(raw, str): return []
+    if raw.startswith("["):
+        try:
+            return [str(x) for x in ast.literal_eval(raw)]
+        except (ValueError, SyntaxError):
+            pass
+    return raw.split(",")
+
+
+def tokens(text: str) -> set[str]:
+    return {normalise(w) for w in _WORD.findall(str(text).lower())}
+
+
+class IngredientIndex:
+    def __init__(self, recipes_df: pd.DataFrame, column: str = "ingredients"):
+        self.n = len(recipes_df)
+        postings: Dict[str, list[int]] = {}
+        rows: list[int] = []                             # ingredient id → catalog position
+        col = recipes_df[column] if column in recipes_df.columns else pd.Series([None] * self.n)
+        seen: Dict[str, set[str]] = {}                   # ingredient lines repeat a lot
+        for pos, raw in enumerate(col.to_numpy()):
+            for item in _ingredients(raw):
+                g = len(rows); rows.append(pos)
+                toks = seen.get(item)
+                if toks is None: toks = seen[item] = tokens(item)
+                for tok in toks:
+                    postings.setdefault(tok, []).append(g)
+        self.row_of = np.asarray(rows, dtype=np.int32)
+        self.postings = {t: np.asarray(p, dtype=np.int32) for t, p in postings.items()}
+        self._expanded: Dict[str, list[str]] = {}
+
+    def __len__(self):
+        return len(self.postings)
+
+    def expand(self, word: str) -> list[str]:
+        """`word` and its `COMPOUNDS`, as far as they occur in the catalog."""
+        hit = self._expanded.get(word)
+        if hit is None:
+            hit = self._expanded[word] = [t for t in (word,) + COMPOUNDS.get(word, ())
+                                          if t in self.postings]
+        return hit
+
+    def _ingredient_ids(self, word: str) -> np.ndarray:
+        lists = [self.postings[t] for t in self.expand(word)]
+        if not lists: return np.empty(0, dtype=np.int32)
+        return lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+
+    def rows(self, term: str) -> np.ndarray:
+        """Catalog positions with one ingredient matching every word of `term`."""
+        words = tokens(term)
+        if not words: return np.empty(0, dtype=np.int32)
+        ids = None
+        for w in sorted(words, key=len, reverse=True):   # longest word → shortest list, usually
+            cur = self._ingredient_ids(w)
+            ids = cur if ids is None else np.intersect1d(ids, cur, assume_unique=True)
+            if not len(ids): break
+        return np.unique(self.row_of[ids])
+
+    def mask(self, include: Iterable[str] = (), exclude: Iterable[str] = ()) -> np.ndarray:
+        """Rows that contain all `include` terms and none of the `exclude` terms."""
+        out = np.ones(self.n, dtype=bool)
+        for term in include:
+            keep = np.zeros(self.n, dtype=bool); keep[self.rows(term)] = True
+            out &= keep
+        for term in exclude:
+            out[self.rows(term)] = False
+        return out
+
+    def search(self, *terms: str) -> np.ndarray:
+        """Catalog positions of recipes containing all `terms`."""
+        return np.flatnonzero(self.mask(include=terms))
@@ -0,0 +1,131 @@
+"""
+Per‑user preference signal from the feedback store.
+
+Feedback rows carry no user id, so a "user" is the profile that produced the
+row (age, gender, height, weight, activity).  `FeedbackMatrix` keeps two
+scipy.sparse user × recipe matrices – rating sums and counts – so a user's
+mean satisfaction for every recipe is one sparse row lookup.  New feedback is
+appended with `add()` in O(new rows); the COO buffers are merged into the CSR
+matrices lazily, on the next lookup.  Nothing ever rescans the feedback table.
+"""
+from __future__ import annotations
+import threading
+import weakref
+from typing import Any, Dict, Hashable
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+def user_key(p: Dict[str, Any]) -> Hashable:
+    return (int(p["age"]), str(p.get("gender", "M")).upper(),
+            int(p["height"]), int(p["weight"]), str(p["activity_level"]))
+
+
+class FeedbackMatrix:
+    def __init__(self):
+        self._users: Dict[Hashable, int] = {}
+        self._recipes: Dict[Any, int] = {}
+        self._recipe_ids: list = []
+        self._sum = sparse.csr_matrix((0, 0))
+        self._cnt = sparse.csr_matrix((0, 0))
+        self._pending: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._lock = threading.Lock()             # lookups may run on scoring threads
+        self.rows_seen = 0
+
+    @classmethod
+    def from_frame(cls, feedback_df: pd.DataFrame) -> "FeedbackMatrix":
+        fm = cls(); fm.add(feedback_df)
+        return fm
+
+    # ───────── updates ─────────
+    def add(self, rows: pd.DataFrame):
+        """Fold new feedback rows in (needs recipe_id + satisfaction; `count` optional)."""
+        self.rows_seen += len(rows)
+        if rows.empty or not {"recipe_id", "satisfaction"} <= set(rows.columns):
+            return
+        df = rows.copy()
+        df["satisfaction"] = pd.to_numeric(df["satisfaction"], errors="coerce")
+        df = df[df["satisfaction"].between(1, 5) & df["recipe_id"].notna()]
+        if "gender" not in df.columns: df["gender"] = "M"
+        for col in ("age", "height", "weight"):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        df = df.dropna(subset=["age", "height", "weight"])
+        if df.empty: return
+
+        keys = list(zip(df["age"].astype(int), df["gender"].astype(str).str.upper(),
+                        df["height"].astype(int), df["weight"].astype(int),
+                        df["activity_level"].astype(str)))
+        r = np.fromiter((self._users.setdefault(k, len(self._users)) for k in keys),
+                        dtype=np.int64, count=len(keys))
+        c = np.empty(len(df), dtype=np.int64)
+        for i, rid in enumerate(df["recipe_id"].to_numpy()):
+            j = self._recipes.get(rid)
+            if j is None:
+                j = self._recipes[rid] = len(self._recipe_ids)
+                self._recipe_ids.append(rid)
+            c[i] = j
+        n = (df["count"].to_numpy(float) if "count" in df.columns
+             else np.ones(len(df)))
+        self._pending.append((r, c, df["satisfaction"].to_numpy(float) * n, n))
+
+    def _compact(self):
+        with self._lock:                           # waiters see the merged matrices
+            if not self._pending: return
+            shape = (len(self._users), len(self._recipe_ids))
+            r, c, s, n = (np.concatenate(x) for x in zip(*self._pending))
+            self._pending.clear()
+            for name, vals in (("_sum", s), ("_cnt", n)):
+                m = getattr(self, name).copy()
+                m.resize(shape)
+                setattr(self, name, (m + sparse.coo_matrix((vals, (r, c)), shape=shape)).tocsr())
+
+    # ───────── lookups ─────────
+    def has_user(self, profile: Dict[str, Any]) -> bool:
+        return user_key(profile) in self._users
+
+    def user_vector(self, profile: Dict[str, Any], recipe_ids) -> np.ndarray:
+        """
+        Centred mean rating per recipe for this user, aligned with `recipe_ids`:
+        (mean − 3) / 2 ∈ [−1, 1] for rated recipes, 0 otherwise.
+        """
+        ids = np.asarray(recipe_ids)
+        out = np.zeros(len(ids))
+        u = self._users.get(user_key(profile))
+        if u is None: return out
+        self._compact()
+        s, n = self._sum.getrow(u), self._cnt.getrow(u)
+        if not n.nnz: return out
+        rated = np.asarray(self._recipe_ids, dtype=object)[n.indices]
+        mean = (s.data / n.data if np.array_equal(s.indices, n.indices)
+                else s.toarray().ravel()[n.indices] / n.data)
+        try:
+            order = np.argsort(rated.astype(ids.dtype))
+            rated = rated.astype(ids.dtype)[order]; mean = mean[order]
+        except (TypeError, ValueError):
+            return out
+        pos = np.minimum(np.searchsorted(rated, ids), len(rated) - 1)
+        hit = rated[pos] == ids
+        out[hit] = (mean[pos[hit]] - 3.0) / 2.0
+        return out
+
+
+# ───────── DataFrame → matrix, built once per frame ─────────
+_BY_FRAME: Dict[int, tuple[weakref.ref, FeedbackMatrix]] = {}
+
+def for_frame(feedback_df: pd.DataFrame) -> FeedbackMatrix:
+    """
+    Matrix for a feedback DataFrame, cached on the frame's identity.  Rows
+    appended to the same frame since the last call are folded in
+    incrementally.
+    """
+    key = id(feedback_df)
+    hit = _BY_FRAME.get(key)
+    if hit is None or hit[0]() is not feedback_df:
+        fm = FeedbackMatrix()
+        _BY_FRAME[key] = (weakref.ref(feedback_df, lambda _, k=key: _BY_FRAME.pop(k, None)), fm)
+    else:
+        fm = hit[1]
+    if len(feedback_df) > fm.rows_seen:
+        fm.add(feedback_df.iloc[fm.rows_seen:])
+    return fm
@@ -0,0 +1,230 @@
+"""
+Multi‑day meal‑plan optimiser.
+
+`plan_day` simply takes the best recipes per meal.  `plan_days` instead picks
+one breakfast, lunch and dinner for each of N days so that the summed score is
+maximal while
+
+• every day's nutrient totals stay inside `bounds`
+  (e.g. {"calories": (1500, 2300), "protein": (50, None), "sodium": (None, 2300)})
+• a recipe appears at most once in any `repeat_window` consecutive days.
+
+The catalog is scored once, each meal list is pruned to a few dozen
+candidates, every feasible (breakfast, lunch, dinner) combination is
+enumerated with numpy and the best `options_per_day` kept – capped per
+recipe so they span at least `OPTION_SPREAD` recipes per meal for every day
+of the repeat window, which therefore cannot empty the option set.
+
+A depth‑first branch‑and‑bound over days then assembles the plan.  Days
+inside one repeat window must use different recipes for every meal, so the
+remaining days are bounded block by block with the best sum of that many
+distinct recipes per meal (`_window_bound`); the search stops as soon as the
+incumbent reaches the bound.  It is anytime – when `time_budget` runs out the
+best plan found so far is returned.  If the search finishes without a plan
+while candidates or options were cut, it retries with larger sets (up to
+`MAX_COMBOS` enumerated combinations) before giving up.
+"""
+from __future__ import annotations
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from engine.recommender import MEALS, score_recipes
+
+Bounds = Dict[str, Tuple[Optional[float], Optional[float]]]
+
+# ───────── Search knobs ─────────
+CANDIDATES      = 30     # best‑scored recipes kept per meal
+EXTREME_EXTRA   = 8      # + recipes kept per bounded nutrient (helps feasibility)
+OPTIONS_PER_DAY = 400    # best feasible meal combinations searched per day
+OPTION_SPREAD   = 4      # distinct recipes per meal kept per repeat‑window day
+TIME_BUDGET     = 0.5    # seconds
+MAX_COMBOS      = 1_000_000   # meal combinations enumerated per round (memory cap)
+_CHECK_EVERY    = 256    # nodes between clock checks
+
+
+def _prune(meal_df: pd.DataFrame, bounds: Bounds, k: int) -> pd.DataFrame:
+    """Top‑k by score plus the recipes most useful for each bound."""
+    keep = meal_df.nlargest(k, "score", keep="first").index
+    for col, (lo, hi) in bounds.items():
+        if hi is not None:
+            keep = keep.union(meal_df.nsmallest(EXTREME_EXTRA, col).index)
+        if lo is not None:
+            keep = keep.union(meal_df.nlargest(EXTREME_EXTRA, col).index)
+    return meal_df.loc[keep]
+
+
+def _day_options(cands: list[pd.DataFrame], bounds: Bounds, limit: int, repeat: int):
+    """
+    Best feasible meal combinations, each recipe in at most `repeat` of them
+    → (scores desc, row labels per meal, whether `limit` dropped any).
+    """
+    grids = np.meshgrid(*[np.arange(len(c)) for c in cands], indexing="ij")
+    picks = [g.ravel() for g in grids]
+
+    total = sum(c["score"].to_numpy(float)[p] for c, p in zip(cands, picks))
+    ok = np.ones(total.shape, dtype=bool)
+    for col, (lo, hi) in bounds.items():
+        amount = sum(c[col].to_numpy(float)[p] for c, p in zip(cands, picks))
+        if lo is not None: ok &= amount >= lo
+        if hi is not None: ok &= amount <= hi
+
+    idx = np.flatnonzero(ok)
+    idx = idx[np.argsort(-total[idx], kind="stable")]
+    # greedy in score order: an option is kept while each of its recipes is
+    # in fewer than `repeat` kept ones
+    rows = np.column_stack([p[idx] for p in picks]).tolist()
+    used = [np.zeros(len(c), dtype=np.int64) for c in cands]
+    kept, cut = [], False
+    for i, row in zip(idx.tolist(), rows):
+        if any(u[r] >= repeat for u, r in zip(used, row)):
+            continue
+        if len(kept) == limit:
+            cut = True
+            break
+        kept.append(i)
+        for u, r in zip(used, row): u[r] += 1
+    idx = np.asarray(kept, dtype=np.int64)
+
+    labels = np.column_stack([c.index.to_numpy()[p[idx]] for c, p in zip(cands, picks)])
+    return total[idx], labels, cut
+
+
+def _window_bound(opt_score: np.ndarray, opt_meal: np.ndarray, opt_keys: np.ndarray,
+                  days: int, window: int) -> np.ndarray:
+    """
+    Upper bound on the score of the last r days, for r = 0..days.  The k ≤
+    window + 1 options of one block share no recipe, so a block scores at most
+    the k best options and at most, per meal, the k best distinct recipes.
+    """
+    span = min(days, window + 1)
+    def top_k(values):                         # fewer than k values → k days infeasible
+        cum = np.cumsum(values[:span])
+        return np.concatenate([cum, np.full(span - len(cum), -np.inf)])
+    per_meal = np.zeros(span)
+    for m in range(opt_meal.shape[1]):
+        best = pd.Series(opt_meal[:, m]).groupby(opt_keys[:, m]).max()
+        per_meal += top_k(np.sort(best.to_numpy())[::-1])
+    block = np.concatenate([[0.0], np.minimum(top_k(opt_score), per_meal)])
+    return np.array([block[r % span] + (r // span * block[span] if r >= span else 0.0)
+                     for r in range(days + 1)])
+
+
+def _search(opt_score: np.ndarray, opt_keys: np.ndarray, bound: np.ndarray,
+            days: int, window: int, deadline: float):
+    """
+    Depth‑first branch‑and‑bound over days; `opt_keys` holds the recipe ids
+    the repeat window applies to, `bound[r]` caps the score of r more days.
+    Returns (best, plan, complete).
+    """
+    best = [-np.inf, None]
+    goal = bound[days] - 1e-9 * max(1.0, abs(bound[days]))
+    last_used: Dict[Any, int] = {}
+    chosen: list[int] = []
+    nodes = 0
+    timed_out = solved = False
+
+    def dfs(day: int, acc: float):
+        nonlocal nodes, timed_out, solved
+        if day == days:
+            if acc > best[0]: best[:] = [acc, list(chosen)]
+            solved = acc >= goal               # meets the bound → provably optimal
+            return
+        remaining = days - day - 1
+        if acc + bound[remaining + 1] <= best[0]:
+            return
+        for o in range(len(opt_score)):
+            if acc + opt_score[o] + bound[remaining] <= best[0]:
+                return                         # sorted → nothing better follows
+            labels = opt_keys[o]
+            if any(day - last_used.get(l, -window - 1) <= window for l in labels):
+                continue
+            nodes += 1
+            if nodes % _CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                timed_out = True
+            if timed_out or solved:
+                return
+            prev = [last_used.get(l) for l in labels]
+            for l in labels: last_used[l] = day
+            chosen.append(o)
+            dfs(day + 1, acc + opt_score[o])
+            chosen.pop()
+            for l, p in zip(labels, prev):
+                if p is None: del last_used[l]
+                else: last_used[l] = p
+            if timed_out or solved:
+                return
+
+    dfs(0, 0.0)
+    return best[0], best[1], not timed_out
+
+
+def plan_days(profile: Dict[str, Any], fuzzy_out: Dict[str, Dict[str, float]],
+              recipes_df: pd.DataFrame, days: int = 7,
+              bounds: Optional[Bounds] = None, repeat_window: int = 3,
+              candidates: int = CANDIDATES, options_per_day: int = OPTIONS_PER_DAY,
+              time_budget: float = TIME_BUDGET, features=None,
+              feedback=None, mask=None) -> pd.DataFrame:
+    """
+    One recipe per meal for `days` days.
+
+    Returns a frame with `day`, `meal_type`, the recipe columns and `score`;
+    `attrs["plan_score"]` holds the total and `attrs["optimal"]` tells whether
+    the search finished inside `time_budget` (otherwise it is best‑so‑far).
+    Empty if no plan satisfies the constraints.  `mask` (bool per catalog
+    row, e.g. from `engine.ingredients.IngredientIndex.mask`) drops recipes
+    before scoring.
+    """
+    deadline = time.perf_counter() + time_budget
+    bounds = bounds or {}
+    window = max(0, repeat_window - 1)         # days a used recipe stays blocked
+
+    if mask is not None: recipes_df = recipes_df[np.asarray(mask, dtype=bool)]
+    scored = score_recipes(profile, fuzzy_out, recipes_df, features, feedback)
+    scored = scored.reset_index(drop=True)
+    for col in bounds:
+        if col not in scored.columns: scored[col] = 0.0
+
+    meal_key = scored["meal_type"].astype(str).str.lower()
+    meals, cands = [], []
+    for meal in MEALS:
+        sub = scored[meal_key == meal]
+        if not sub.empty:
+            meals.append(meal)
+            cands.append(_prune(sub, bounds, candidates))
+
+    empty = pd.DataFrame(columns=["day"] + scored.columns.tolist())
+    if not cands: return empty
+
+    ids = scored["recipe_id"] if "recipe_id" in scored.columns else scored.index.to_series()
+    score = scored["score"].to_numpy(float)
+    while True:
+        repeat = max(1, options_per_day // (OPTION_SPREAD * min(days, window + 1)))
+        opt_score, opt_labels, cut = _day_options(cands, bounds, options_per_day, repeat)
+        plan = None
+        if len(opt_score):
+            opt_keys = ids.to_numpy()[opt_labels]
+            bound = _window_bound(opt_score, score[opt_labels], opt_keys, days, window)
+            total, plan, complete = _search(opt_score, opt_keys, bound, days, window, deadline)
+        pruned = any(len(c) < (meal_key == m).sum() for c, m in zip(cands, meals))
+        if plan is not None or not (cut or pruned) or time.perf_counter() > deadline:
+            break
+        # nothing fits inside the kept sets → widen them and search again
+        wider = [_prune(scored[meal_key == m], bounds, candidates * 2) for m in meals]
+        if np.prod([len(c) for c in wider], dtype=float) > MAX_COMBOS:
+            break
+        cands, candidates, options_per_day = wider, candidates * 2, options_per_day * 4
+    if plan is None: return empty
+
+    rows = []
+    for day, o in enumerate(plan, start=1):
+        for meal, label in zip(meals, opt_labels[o]):
+            rec = scored.loc[label].to_dict()
+            rec["day"], rec["meal_type"] = day, meal.title()
+            rows.append(rec)
+    out = pd.DataFrame(rows)[["day"] + scored.columns.tolist()]
+    out.attrs["plan_score"] = round(float(total), 3)
+    out.attrs["optimal"] = complete
+    return out
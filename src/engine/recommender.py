@@ -1,88 +1,325 @@
 from __future__ import annotations
-import re
+import copy
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import Dict, Any, List
 
 import numpy as np
 import pandas as pd
 
-from utils.data_loader import compute_bmi
-from anfis_local.infer import score_vectors
+from utils.data_loader import compute_bmi, to_float_series, NUTRIENTS
+from engine import personalize
+from anfis_local.infer import ARTIFACTS, score_vectors_versioned, score_projected
 
 # ───────── Weights (tuned) ─────────
 W_FUZZY_DIET = 1.5     # ↓ less dominant
 W_CALORIE    = 3.0
 W_QUICK      = 1.0
 W_ANFIS_PREF = 3.5     # ↑ gives more variation
+W_FEEDBACK   = 2.0     # user's own past ratings (−1…1)
+
+MEALS = ("breakfast", "lunch", "dinner")
+
+SHARD_MIN_ROWS = 20_000   # a shard smaller than this isn't worth a thread
 
 # ───────── Helpers ─────────
-_NUM_EXTRACT = re.compile(r"([-+]?\d*\.?\d+)")
-
-def _to_float_series(s: pd.Series) -> pd.Series:
-    cleaned = (
-        s.astype(str)
-         .str.replace(",", "", regex=False)
-         .str.extract(_NUM_EXTRACT, expand=False)
-    )
-    return pd.to_numeric(cleaned, errors="coerce").fillna(0.0)
-
-def _calorie_bonus(cals: float, bmi: float) -> float:
-    if np.isnan(cals) or np.isnan(bmi): return 0.0
-    if bmi < 18.5:   return min(cals / 1000.0, 1.0)
-    if bmi > 25:     return max(0.0, (600.0 - cals) / 600.0)
-    return max(0.0, 1.0 - abs(cals - 450.0) / 450.0)
-
-def _feature_vector(p: Dict[str, Any], row: pd.Series) -> list[float]:
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k best scores, ties kept in catalog order."""
+    n = len(scores)
+    if k >= n: return np.argsort(-scores, kind="stable")
+    kth = np.partition(scores, n - k)[n - k]
+    cand = np.flatnonzero(scores >= kth)
+    return cand[np.argsort(-scores[cand], kind="stable")][:k]
+
+def _calorie_bonus(cals: np.ndarray, bmi) -> np.ndarray:
+    """Calorie fit for the user's BMI class; `bmi` may be scalar or per row."""
+    cals = np.asarray(cals, dtype=float)
+    bmi  = np.asarray(bmi, dtype=float)
+    out = np.where(bmi < 18.5, np.minimum(cals / 1000.0, 1.0),
+          np.where(bmi > 25,   np.maximum(0.0, (600.0 - cals) / 600.0),
+                               np.maximum(0.0, 1.0 - np.abs(cals - 450.0) / 450.0)))
+    return np.where(np.isnan(cals) | np.isnan(bmi), 0.0, out)
+
+def _profile_features(p: Dict[str, Any]) -> list[float]:
     bmi = compute_bmi(p["weight"], p["height"])
     gender   = 1 if p.get("gender", "M") == "M" else 0
     activity = {"Low": 0, "Medium": 1, "High": 2}.get(p["activity_level"], 1)
-    return [
-        p["age"], gender, bmi, activity,
-        row["calories"], row["total_fat"], row["sugar"], row["sodium"],
-        row["protein"], row["saturated_fat"], row["carbs"],
-    ]
+    return [p["age"], gender, bmi, activity]
 
-def recommend_recipes(user_profile: Dict[str, Any],
-                      fuzzy_out: Dict[str, Dict[str, float]],
-                      recipes_df: pd.DataFrame,
-                      feedback_df=None,
-                      top_n: int = 3) -> pd.DataFrame:
-    df = recipes_df.copy()
+def _feature_matrix(p: Dict[str, Any], df: pd.DataFrame) -> np.ndarray:
+    """11‑column ANFIS input for every row of an already prepared frame."""
+    X = np.empty((len(df), 4 + len(NUTRIENTS)), dtype=np.float32)
+    X[:, :4] = _profile_features(p)
+    X[:, 4:] = df[NUTRIENTS].to_numpy(dtype=np.float32)
+    return X
 
+def _prepare(recipes_df: pd.DataFrame, features=None, rows=None) -> pd.DataFrame:
+    """
+    Copy with numeric nutrient + prep_time columns (nutrients taken from
+    `features` at `rows` when given).  Frames from `prepare_catalog` only get
+    a shallow copy.
+    """
+    if recipes_df.attrs.get("prepared"): return recipes_df.copy(deep=False)
+    df = recipes_df.copy()
     df = df.rename(columns={"calories_kcal": "calories", "fat_total": "total_fat"})
-    EXPECTED = ["calories","total_fat","sugar","sodium",
-                "protein","saturated_fat","carbs","prep_time"]
-    for col in EXPECTED:
+    if rows is not None:
+        df[NUTRIENTS] = np.asarray(features.features[rows], dtype=np.float64)
+    for col in ([] if rows is not None else NUTRIENTS) + ["prep_time"]:
         if col not in df.columns: df[col] = 0.0
-        df[col] = _to_float_series(df[col])
+        df[col] = to_float_series(df[col])
+    return df
+
+def _shared_rows(features, recipes_df: pd.DataFrame):
+    """
+    Matrix rows of `recipes_df` in `features`: a slice or the index labels for
+    (slices of) a catalog prepared on the mapped matrix, else an id lookup.
+    """
+    if features is None: return None
+    if recipes_df.attrs.get("shared") == features.meta.get("catalog"):
+        idx = recipes_df.index
+        if isinstance(idx, pd.RangeIndex) and idx.step == 1: return slice(idx.start, idx.stop)
+        return idx.to_numpy()
+    if "recipe_id" not in recipes_df.columns: return None
+    return features.rows(recipes_df["recipe_id"].to_numpy())
+
+def prepare_catalog(recipes_df: pd.DataFrame, features=None) -> pd.DataFrame:
+    """
+    Parse the catalog once for serving (numeric nutrients + prep_time,
+    positional index).  Scoring a frame returned here – or any slice of it –
+    neither parses nor deep‑copies it again; keep it instead of the raw one.
+    If `features` was published from this catalog in this order, the nutrient
+    columns are the mapped matrix itself (zero‑copy, shared across processes).
+    """
+    if (features is not None and "recipe_id" in recipes_df.columns
+            and features.aligned(recipes_df["recipe_id"].to_numpy())):
+        rest = recipes_df.drop(columns=NUTRIENTS + ["calories_kcal", "fat_total"],
+                               errors="ignore").reset_index(drop=True)
+        rest["prep_time"] = to_float_series(rest["prep_time"] if "prep_time" in rest.columns
+                                            else pd.Series(0.0, index=rest.index))
+        nutrients = pd.DataFrame(features.features, columns=NUTRIENTS, copy=False)
+        df = pd.concat([rest, nutrients], axis=1, copy=False)
+        df.attrs["shared"] = features.meta.get("catalog")
+    else:
+        df = _prepare(recipes_df, features, _shared_rows(features, recipes_df))
+        df = df.reset_index(drop=True)
+    df.attrs["prepared"] = True
+    return df
+
+def _anfis_pref(p: Dict[str, Any], df: pd.DataFrame, features=None, rows=None):
+    """ANFIS preference per row; uses the shared recipe projection when current."""
+    if features is not None and rows is not None and features.projection is not None:
+        hit = score_projected(_profile_features(p), features.projection[rows],
+                              features.model_version)
+        if hit is not None: return hit
+    return score_vectors_versioned(_feature_matrix(p, df))
+
+def _feedback_matrix(feedback):
+    """FeedbackMatrix as given, or the cached one built from a feedback DataFrame."""
+    if isinstance(feedback, pd.DataFrame): return personalize.for_frame(feedback)
+    return feedback
+
+def _personal(p: Dict[str, Any], df: pd.DataFrame, feedback) -> np.ndarray | float:
+    fm = _feedback_matrix(feedback)
+    if fm is None or "recipe_id" not in df.columns: return 0.0
+    return fm.user_vector(p, df["recipe_id"].to_numpy())
+
+# ───────── Scoring ─────────
+def score_recipes(user_profile: Dict[str, Any],
+                  fuzzy_out: Dict[str, Dict[str, float]],
+                  recipes_df: pd.DataFrame,
+                  features=None,
+                  feedback=None) -> pd.DataFrame:
+    """
+    Cleaned copy of `recipes_df` (catalog order) with a `score` column and the
+    `model_version` of the ANFIS artifacts that produced it.
+
+    `features` is an optional `utils.shared_features.SharedFeatures`; rows
+    found there skip nutrient parsing and reuse the precomputed projection.
+    Pass a `prepare_catalog` frame to skip parsing and copying altogether.
+    `feedback` (an `engine.personalize.FeedbackMatrix` or the feedback
+    DataFrame) adds the user's own past ratings.
+    """
+    rows = _shared_rows(features, recipes_df)
+    df = _prepare(recipes_df, features, rows)
+    if df.empty: return df.assign(score=pd.Series(dtype=float),
+                                  model_version=pd.Series(dtype=str))
 
     bmi_val = compute_bmi(user_profile["weight"], user_profile["height"])
+    pref, version = _anfis_pref(user_profile, df, features, rows)
+    pref = np.asarray(pref)                                               # 0‑1
+
+    diet_w = fuzzy_out["diet_type"]
+    codes, names = pd.factorize(df["diet_type"], use_na_sentinel=False)   # normalise uniques only
+    w = np.array([diet_w.get(str(k).strip().lower(), 0.0) for k in names], dtype=float)
+    s  = (w[codes] if len(w) else np.zeros(len(df)))                 *W_FUZZY_DIET
+    s += _calorie_bonus(df["calories"].to_numpy(), bmi_val)          *W_CALORIE
+    s += (df["prep_time"].to_numpy() <= 15).astype(float)            *W_QUICK
+    s += pref                                                        *W_ANFIS_PREF
+    s += _personal(user_profile, df, feedback)                       *W_FEEDBACK
 
-    vecs, rows = [], []
-    for _, r in df.iterrows():
-        vecs.append(_feature_vector(user_profile, r)); rows.append(r)
-    if not rows: return pd.DataFrame(columns=df.columns.tolist()+["score"])
+    df["score"] = np.round(s, 3)
+    df["model_version"] = version
+    df.attrs.pop("shared", None)       # results get re‑indexed: rows no longer by label
+    return df
 
-    pref = score_vectors(vecs)       # 0‑1
+# ───────── Sharded scoring ─────────
+_POOL: ThreadPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
 
-    scores=[]
-    for i,r in enumerate(rows):
-        diet_key=str(r["diet_type"]).strip().lower()
-        s  = fuzzy_out["diet_type"].get(diet_key,0.0)*W_FUZZY_DIET
-        s += _calorie_bonus(r["calories"], bmi_val) *W_CALORIE
-        s += (1.0 if r["prep_time"]<=15 else 0.0)   *W_QUICK
-        s += pref[i]                                *W_ANFIS_PREF
-        scores.append(s)
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(os.cpu_count() or 1, thread_name_prefix="score-shard")
+    return _POOL
 
-    df["score"]=np.round(scores,3)
-    return df.sort_values("score",ascending=False).head(top_n).reset_index(drop=True)
+def _shard_count(n_rows: int) -> int:
+    return max(1, min(os.cpu_count() or 1, n_rows // SHARD_MIN_ROWS))
+
+def _shard_top(user_profile, fuzzy_out, shard, start, k, features, feedback):
+    """Scored local top‑k of one shard + its (−score, catalog position) keys."""
+    df = score_recipes(user_profile, fuzzy_out, shard, features, feedback)
+    if df.empty: return df, []
+    s = df["score"].to_numpy()
+    best = _top_k(s, k)
+    return df.iloc[best], [(-s[i], start + i) for i in best]
+
+def _recommend_sharded(user_profile, fuzzy_out, recipes_df, feedback, top_n,
+                       features, n_shards) -> pd.DataFrame:
+    """
+    Score `n_shards` contiguous slices in parallel, keep each slice's top‑n and
+    heap‑merge on (−score, catalog position) – the same order as the stable
+    sort over the whole catalog, so results are identical.  The catalog is
+    parsed once up front (free for a `prepare_catalog` frame): pandas string
+    parsing holds the GIL, the per‑shard numpy/torch work mostly does not.
+    """
+    feedback = _feedback_matrix(feedback)          # resolved once, not per thread
+    if not recipes_df.attrs.get("prepared"):
+        recipes_df = prepare_catalog(recipes_df, features)
+    bounds = np.linspace(0, len(recipes_df), n_shards + 1).astype(int)
+    futures = [_pool().submit(_shard_top, user_profile, fuzzy_out, recipes_df.iloc[a:b],
+                              a, top_n, features, feedback)
+               for a, b in zip(bounds[:-1], bounds[1:])]
+    parts = [f.result() for f in futures]
+    tops = pd.concat([df for df, _ in parts], ignore_index=True)
+    if tops["model_version"].nunique() > 1:        # model swapped mid‑request
+        return recommend_recipes(user_profile, fuzzy_out, recipes_df, feedback, top_n,
+                                 features, shards=1)
+    row_of = {pos: i for i, (_, pos) in enumerate(kv for _, keys in parts for kv in keys)}
+    order = [row_of[pos] for _, pos in islice(heapq.merge(*(keys for _, keys in parts)), top_n)]
+    return tops.iloc[order].reset_index(drop=True)
+
+def recommend_recipes(user_profile: Dict[str, Any],
+                      fuzzy_out: Dict[str, Dict[str, float]],
+                      recipes_df: pd.DataFrame,
+                      feedback_df=None,
+                      top_n: int = 3,
+                      features=None,
+                      mask=None,
+                      shards: int | None = None) -> pd.DataFrame:
+    """
+    Top‑n of `recipes_df`; `mask` (bool per row, see engine.ingredients) filters
+    first.  Large catalogs are scored in parallel shards (`shards`, default by
+    catalog size and core count) with the same result as a single pass.
+    """
+    if mask is not None: recipes_df = recipes_df[np.asarray(mask, dtype=bool)]
+    n_shards = shards or _shard_count(len(recipes_df))
+    if n_shards > 1 and top_n > 0 and len(recipes_df) >= n_shards:
+        return _recommend_sharded(user_profile, fuzzy_out, recipes_df, feedback_df,
+                                  top_n, features, n_shards)
+    df = score_recipes(user_profile, fuzzy_out, recipes_df, features, feedback_df)
+    if df.empty: return pd.DataFrame(columns=df.columns.tolist())
+    return (df.sort_values("score", ascending=False, kind="stable")
+              .head(top_n).reset_index(drop=True))
 
 def plan_day(profile: Dict[str,Any], fuzzy_out: Dict[str,Dict[str,float]],
-             recipes_df: pd.DataFrame, per_session:int=3)->pd.DataFrame:
+             recipes_df: pd.DataFrame, per_session:int=3,
+             features=None, feedback=None, mask=None)->pd.DataFrame:
     rows=[]
-    for meal in ("breakfast","lunch","dinner"):
-        sub=recipes_df[recipes_df["meal_type"].str.lower()==meal]
-        best=recommend_recipes(profile,fuzzy_out,sub,top_n=per_session)
+    keep=np.ones(len(recipes_df),dtype=bool) if mask is None else np.asarray(mask,dtype=bool)
+    for meal in MEALS:
+        sub=recipes_df[(recipes_df["meal_type"].str.lower()==meal).to_numpy() & keep]
+        best=recommend_recipes(profile,fuzzy_out,sub,feedback_df=feedback,
+                               top_n=per_session,features=features)
         if not best.empty:
             best.loc[:,"meal_type"]=meal.title()
             rows.extend(best.to_dict(orient="records"))
     return pd.DataFrame(rows)
+
+
+# ───────── Incremental session ─────────
+class RecommendSession:
+    """
+    Score components of one user's catalog, kept between requests.
+
+    The ANFIS preference only depends on age/gender/height/weight/activity
+    (and the model version), the calorie bonus only on BMI, the quick bonus
+    only on the catalog.  `plan_day` recomputes just the components whose
+    inputs changed and re‑blends them with the current fuzzy diet weights, so
+    a satiety tweak costs a vector add plus a top‑k per meal.  Results match
+    the module‑level `plan_day`.
+    """
+
+    def __init__(self, recipes_df: pd.DataFrame, features=None, feedback=None):
+        self.features = features
+        self.feedback = feedback
+        self.rows = _shared_rows(features, recipes_df)
+        self.df = _prepare(recipes_df, features, self.rows)
+        if not recipes_df.attrs.get("prepared"): self.df = self.df.reset_index(drop=True)
+
+        diet_keys = self.df["diet_type"].astype(str).str.strip().str.lower()
+        self.diet_codes, self.diet_names = pd.factorize(diet_keys)
+        self.quick = (self.df["prep_time"].to_numpy() <= 15).astype(float)
+        meal_key = self.df["meal_type"].astype(str).str.lower()
+        self.meal_pos = {m: np.flatnonzero(meal_key.to_numpy() == m) for m in MEALS}
+
+        self._pref_key = self._bmi = None
+        self.pref = self.cal = None
+        self.version = None
+
+    def fork(self) -> "RecommendSession":
+        """Same catalog, fresh per‑user caches (the read‑only arrays are shared)."""
+        other = copy.copy(self)
+        other._pref_key = other._bmi = other.pref = other.cal = other.version = None
+        return other
+
+    def _update(self, p: Dict[str, Any]):
+        key = (p["age"], p.get("gender", "M"), p["height"], p["weight"],
+               p["activity_level"], ARTIFACTS.version)
+        if key != self._pref_key:
+            pref, self.version = _anfis_pref(p, self.df, self.features, self.rows)
+            self.pref, self._pref_key = np.asarray(pref), key
+        bmi = compute_bmi(p["weight"], p["height"])
+        if bmi != self._bmi:
+            self.cal, self._bmi = _calorie_bonus(self.df["calories"].to_numpy(), bmi), bmi
+
+    def scores(self, profile: Dict[str, Any],
+               fuzzy_out: Dict[str, Dict[str, float]]) -> np.ndarray:
+        self._update(profile)
+        diet_w = np.array([fuzzy_out["diet_type"].get(k, 0.0) for k in self.diet_names])
+        s  = (diet_w[self.diet_codes] if len(diet_w) else 0.0)*W_FUZZY_DIET
+        s  = s + self.cal                                        *W_CALORIE
+        s += self.quick                                          *W_QUICK
+        s += self.pref                                           *W_ANFIS_PREF
+        s += _personal(profile, self.df, self.feedback)          *W_FEEDBACK
+        return np.round(s, 3)
+
+    def plan_day(self, profile: Dict[str, Any],
+                 fuzzy_out: Dict[str, Dict[str, float]],
+                 per_session: int = 3, mask=None) -> pd.DataFrame:
+        if self.df.empty: return pd.DataFrame()
+        s = self.scores(profile, fuzzy_out)
+        parts = []
+        for meal in MEALS:
+            pos = self.meal_pos[meal]
+            if mask is not None: pos = pos[np.asarray(mask, dtype=bool)[pos]]
+            if not len(pos): continue
+            best = pos[_top_k(s[pos], per_session)]
+            parts.append(self.df.iloc[best].assign(
+                score=s[best], model_version=self.version, meal_type=meal.title()))
+        out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        out.attrs.pop("shared", None)
+        return out
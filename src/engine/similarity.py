@@ -0,0 +1,99 @@
+"""
+Nutrient‑space nearest‑neighbour index over the recipe catalog.
+
+Recipes are points in the standardised 7‑nutrient space (`NUTRIENTS`).  A
+KD‑tree over the whole catalog – and one per `diet_type` – answers "k most
+similar recipes" and "swap this meal for a lower‑sodium equivalent" without
+scanning the catalog; id and name lookups are plain dicts.
+"""
+from __future__ import annotations
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from utils.data_loader import NUTRIENTS, recipe_features
+
+
+class RecipeIndex:
+    def __init__(self, recipes_df: pd.DataFrame, leaf_size: int = 40):
+        self.df = recipes_df                              # rows addressed by position
+        X = recipe_features(self.df).astype(np.float64)
+        self.nutrients = X
+        self.mean = X.mean(axis=0) if len(X) else np.zeros(len(NUTRIENTS))
+        std = X.std(axis=0) if len(X) else np.ones(len(NUTRIENTS))
+        self.std = np.where(std > 0, std, 1.0)
+        self.Z = (X - self.mean) / self.std
+
+        self._trees: Dict[Optional[str], tuple[KDTree, np.ndarray]] = {}
+        if len(X):
+            self._trees[None] = (KDTree(self.Z, leaf_size=leaf_size), np.arange(len(X)))
+        diets = (self.df["diet_type"].astype(str).str.strip().str.lower()
+                 if "diet_type" in self.df.columns else pd.Series("", index=self.df.index))
+        self.diets = diets.to_numpy()
+        self.meals = (self.df["meal_type"].astype(str).str.lower().to_numpy()
+                      if "meal_type" in self.df.columns else None)
+        for diet, pos in diets.groupby(diets).indices.items():
+            self._trees[diet] = (KDTree(self.Z[pos], leaf_size=leaf_size), pos)
+
+        self._by_id = ({rid: i for i, rid in enumerate(self.df["recipe_id"])}
+                       if "recipe_id" in self.df.columns else {})
+        self._by_name: Dict[str, int] = {}
+        if "name" in self.df.columns:
+            for i, name in enumerate(self.df["name"].astype(str).str.lower()):
+                self._by_name.setdefault(name, i)        # first match, like the old scan
+
+    # ───────── O(1) lookups ─────────
+    def by_id(self, recipe_id) -> Optional[pd.Series]:
+        i = self._by_id.get(recipe_id)
+        return None if i is None else self.df.iloc[i]
+
+    def by_name(self, name: str) -> Optional[pd.Series]:
+        i = self._by_name.get(str(name).lower())
+        return None if i is None else self.df.iloc[i]
+
+    # ───────── neighbour queries ─────────
+    def _neighbours(self, i: int, k: int, same_diet: bool, keep=None) -> tuple[np.ndarray, np.ndarray]:
+        """Up to k nearest positions to row i (itself excluded) passing `keep`."""
+        tree, pos = self._trees.get(self.diets[i] if same_diet else None, (None, None))
+        if tree is None: return np.empty(0, int), np.empty(0)
+        n, ask = len(pos), k + 1
+        while True:
+            ask = min(ask, n)
+            dist, idx = tree.query(self.Z[i:i + 1], k=ask)
+            cand, dist = pos[idx[0]], dist[0]
+            ok = cand != i
+            if keep is not None: ok &= keep(cand)
+            if ok.sum() >= k or ask == n:
+                return cand[ok][:k], dist[ok][:k]
+            ask *= 4                                     # widen and retry
+
+    def _frame(self, cand: np.ndarray, dist: np.ndarray) -> pd.DataFrame:
+        out = self.df.iloc[cand].copy()
+        out["distance"] = np.round(dist, 4)
+        return out.reset_index(drop=True)
+
+    def similar(self, recipe_id, k: int = 5, same_diet: bool = False) -> pd.DataFrame:
+        """k recipes closest in nutrient profile to `recipe_id`."""
+        i = self._by_id.get(recipe_id)
+        if i is None: return self.df.iloc[:0].assign(distance=pd.Series(dtype=float))
+        return self._frame(*self._neighbours(i, k, same_diet))
+
+    def swap(self, recipe_id, nutrient: str = "sodium", k: int = 1,
+             same_diet: bool = True, same_meal: bool = True) -> pd.DataFrame:
+        """
+        Closest recipes with strictly less `nutrient` than `recipe_id`
+        (e.g. a lower‑sodium equivalent), optionally for the same meal.
+        """
+        i = self._by_id.get(recipe_id)
+        if i is None: return self.df.iloc[:0].assign(distance=pd.Series(dtype=float))
+        col = self.nutrients[:, NUTRIENTS.index(nutrient)]
+        meal = self.meals if same_meal else None
+
+        def keep(cand):
+            ok = col[cand] < col[i]
+            if meal is not None: ok &= meal[cand] == meal[i]
+            return ok
+
+        return self._frame(*self._neighbours(i, k, same_diet, keep))
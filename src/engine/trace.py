@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Request trace capture + replay load tester.
+
+Capture: with SMARTDIET_TRACE=path/to/trace.jsonl[.gz] set, the GUI appends
+every profile it plans for as one compact JSON line
+{"t": epoch, "p": {...}, "x": [excluded ingredients], "r": 1 if a satiety rerank}.
+The file stays open for the session and every line is flushed, so a .gz trace
+is one gzip stream rather than a member per request.
+
+Replay: re‑issue a trace against the engine in‑process – the GUI's path:
+fuzzy rules, ingredient mask, bucket table, else a `RecommendSession` kept
+per user so reranks only re‑blend – or against a local HTTP service, either
+at the recorded pace (`--speed 1`, `--speed 10` = 10× faster) or open‑loop at a
+fixed rate (`--qps 50`), over a thread or process pool.  Latency is measured
+from each request's *scheduled* start, so queueing under overload shows up
+in the percentiles instead of silently slowing the sender.
+
+    $ python src/engine/trace.py trace.jsonl --qps 40 --workers 8
+    $ python src/engine/trace.py trace.jsonl --speed 5 --url http://localhost:8000/plan
+"""
+from __future__ import annotations
+import argparse
+import atexit
+import gzip
+import multiprocessing
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+TRACE_ENV = "SMARTDIET_TRACE"
+_SHORT = {"age": "a", "height": "h", "weight": "w", "activity_level": "l",
+          "satiety": "s", "gender": "g"}
+_LONG = {v: k for k, v in _SHORT.items()}
+
+
+def _open(path: Path, mode: str):
+    return gzip.open(path, mode + "t") if str(path).endswith(".gz") else open(path, mode)
+
+
+# ───────── capture ─────────
+class TraceRecorder:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._f = _open(self.path, "a")
+        atexit.register(self.close)
+
+    def record(self, profile: Dict[str, Any], ts: Optional[float] = None,
+               exclude=(), rerank: bool = False):
+        rec = {"t": round(ts if ts is not None else time.time(), 3),
+               "p": {_SHORT[k]: v for k, v in profile.items() if k in _SHORT}}
+        if exclude: rec["x"] = list(exclude)
+        if rerank: rec["r"] = 1
+        line = json.dumps(rec, separators=(",", ":"))
+        with self._lock:
+            if self._f is None: return
+            self._f.write(line + "\n")
+            self._f.flush()                       # gzip: sync flush, same member
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close(); self._f = None
+
+
+def recorder_from_env() -> Optional[TraceRecorder]:
+    path = os.environ.get(TRACE_ENV)
+    return TraceRecorder(path) if path else None
+
+
+def read_trace(path) -> Iterator[tuple[float, Dict[str, Any]]]:
+    """(t, request) with request = {"profile", "exclude", "rerank"}."""
+    with _open(Path(path), "r") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                yield rec["t"], {"profile": {_LONG[k]: v for k, v in rec["p"].items()},
+                                 "exclude": rec.get("x", []), "rerank": bool(rec.get("r"))}
+
+
+# ───────── targets ─────────
+_STATE: Dict[str, Any] = {}
+_FUZZY_LOCK = threading.Lock()          # rules.diet_simulator is a shared global
+_SESSIONS_LOCK = threading.Lock()
+SESSIONS = 256                          # per‑user sessions kept per worker
+
+
+def _init_process(url: Optional[str], started):
+    """Process‑pool initializer: `_init_worker`, then count this process as ready."""
+    _init_worker(url)
+    with started.get_lock():
+        started.value += 1
+
+
+def _init_worker(url: Optional[str]):
+    """Per‑worker setup (runs once per process; once in total for threads)."""
+    if url:
+        import requests
+        _STATE["session"], _STATE["url"] = requests.Session(), url
+        return
+    src = Path(__file__).resolve().parents[1]
+    for p in (str(src), str(src.parent)):
+        if p not in sys.path: sys.path.insert(0, p)
+    from collections import OrderedDict
+    from utils import data_loader, shared_features
+    from engine import bucket_cache, personalize, recommender
+    from engine.ingredients import IngredientIndex
+    from fuzzy_logic import rules
+    recipes, feedback = data_loader.load_data(compacted=True)          # as the GUI
+    features = shared_features.attach()
+    catalog = recommender.prepare_catalog(recipes, features)
+    del recipes
+    fm = personalize.FeedbackMatrix.from_frame(feedback)
+    _STATE.update(loader=data_loader, rules=rules, feedback=fm,
+                  ingredients=IngredientIndex(catalog),
+                  buckets=bucket_cache.load_table(catalog),
+                  template=recommender.RecommendSession(catalog, features, fm),
+                  sessions=OrderedDict())
+
+
+def _session(profile: Dict[str, Any]):
+    """(lock, RecommendSession) for this user – warm for the user's reranks."""
+    from engine.personalize import user_key
+    key, sessions = user_key(profile), _STATE["sessions"]
+    with _SESSIONS_LOCK:
+        hit = sessions.pop(key, None) or (threading.Lock(), _STATE["template"].fork())
+        sessions[key] = hit
+        while len(sessions) > SESSIONS: sessions.popitem(last=False)
+    return hit
+
+
+def _issue(req: Dict[str, Any]) -> Optional[str]:
+    """Run one request the way the GUI does; returns an error string or None."""
+    profile = req["profile"]
+    try:
+        if "url" in _STATE:
+            body = {**profile, "exclude": req["exclude"], "rerank": req["rerank"]}
+            r = _STATE["session"].post(_STATE["url"], json=body, timeout=30)
+            r.raise_for_status()
+            return None
+        rules = _STATE["rules"]
+        bmi = _STATE["loader"].compute_bmi(profile["weight"], profile["height"])
+        try:
+            with _FUZZY_LOCK:
+                rules.get_fuzzy_memberships(profile, bmi)
+                fz = rules.get_fuzzy_output(); assert "diet_type" in fz
+        except Exception:
+            fz = {"diet_type": {"balanced": 1.0}}
+        mask = _STATE["ingredients"].mask(exclude=req["exclude"]) if req["exclude"] else None
+        plan = None
+        if _STATE["buckets"] and mask is None and not _STATE["feedback"].has_user(profile):
+            plan = _STATE["buckets"].plan_day(profile, per_session=3)
+        if plan is None:
+            lock, sess = _session(profile)
+            with lock:
+                sess.plan_day(profile, fz, per_session=3, mask=mask)
+        return None
+    except Exception as e:                                    # counted, not fatal
+        return f"{type(e).__name__}: {e}"
+
+
+def _timed(req: Dict[str, Any]) -> tuple[float, float, Optional[str]]:
+    """(service seconds, completion time, error); monotonic is system‑wide, so
+    completion times from worker processes compare with the dispatcher's."""
+    t0 = time.monotonic()
+    err = _issue(req)
+    t1 = time.monotonic()
+    return t1 - t0, t1, err
+
+
+# ───────── replay ─────────
+def replay(trace, speed: float = 1.0, qps: Optional[float] = None,
+           workers: int = 4, processes: bool = False, url: Optional[str] = None,
+           limit: Optional[int] = None) -> Dict[str, Any]:
+    reqs = list(trace)[:limit]
+    if not reqs: return {"requests": 0}
+    t_first = reqs[0][0]
+    if qps:
+        offsets = np.arange(len(reqs)) / qps
+    else:
+        offsets = np.array([(t - t_first) / speed for t, _ in reqs]) if speed != float("inf") \
+                  else np.zeros(len(reqs))
+
+    if processes:
+        started = multiprocessing.Value("i", 0)
+        pool = ProcessPoolExecutor(workers, initializer=_init_process, initargs=(url, started))
+    else:
+        _init_worker(url)
+        pool = ThreadPoolExecutor(workers)
+
+    with pool:
+        if processes:                      # every process started + initialised before the clock
+            warm = [pool.submit(int) for _ in range(workers)]   # each submit spawns one
+            while started.value < workers:
+                for f in warm:
+                    if f.done(): f.result()              # raises if a worker failed to start
+                time.sleep(0.01)
+        start = time.monotonic()
+        futures = []
+        for off, (_, req) in zip(offsets, reqs):
+            delay = start + off - time.monotonic()
+            if delay > 0: time.sleep(delay)
+            futures.append((start + off, pool.submit(_timed, req)))
+        latency, service, errors, last = [], [], [], start
+        for scheduled, fut in futures:
+            svc, done, err = fut.result()
+            service.append(svc)
+            latency.append(max(done - scheduled, svc))
+            last = max(last, done)
+            if err: errors.append(err)
+        wall = last - start
+
+    lat, svc = np.array(latency) * 1000, np.array(service) * 1000
+    rerank = np.array([req["rerank"] for _, req in reqs])
+    pct = lambda a: ({f"p{q}": round(float(np.percentile(a, q)), 2) for q in (50, 90, 99)}
+                     if len(a) else {})
+    return {
+        "requests": len(reqs), "reranks": int(rerank.sum()),
+        "errors": len(errors), "first_errors": errors[:3],
+        "wall_s": round(wall, 3), "throughput_rps": round(len(reqs) / wall, 2),
+        "latency_ms": {**pct(lat), "max": round(float(lat.max()), 2)},
+        "service_ms": {**pct(svc), "max": round(float(svc.max()), 2)},
+        "service_ms_plan": pct(svc[~rerank]), "service_ms_rerank": pct(svc[rerank]),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a captured SmartDiet request trace.")
+    ap.add_argument("trace", type=Path)
+    pace = ap.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0, help="× recorded pace (inf = flat out)")
+    pace.add_argument("--qps", type=float, help="open‑loop fixed request rate")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--processes", action="store_true", help="process pool instead of threads")
+    ap.add_argument("--url", help="POST profiles to this service instead of in‑process")
+    ap.add_argument("--limit", type=int)
+    args = ap.parse_args()
+
+    stats = replay(read_trace(args.trace), args.speed, args.qps, args.workers,
+                   args.processes, args.url, args.limit)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Offline tuner for the blend weights in `engine.recommender`
+(W_FUZZY_DIET, W_CALORIE, W_QUICK, W_ANFIS_PREF).
+
+The four score components are computed once per feedback row of the held‑out
+split (same 80/20 stratified split as `train_satisfaction.py`) and cached in
+data/cache/.  A score for every row under m weight vectors is then a single
+(n × 4) @ (4 × m) product, and NDCG@k against the observed satisfaction is
+averaged over "queries" – rows grouped by profile bucket.  Random search and
+coordinate search evaluate their candidates in parallel batches.  A component
+that is constant inside every query (e.g. W_QUICK when the log has no
+prep_time) cannot change any ranking; its weight is reported and frozen
+instead of being fitted to noise.
+
+    $ python src/engine/tune_weights.py --samples 5000 --rounds 4
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import hashlib
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SRC = Path(__file__).resolve().parents[1]
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+sys.path.append(str(SRC.parent))
+
+from joblib import Parallel, delayed                              # noqa: E402
+from sklearn.model_selection import train_test_split              # noqa: E402
+
+from utils.data_loader import BASE_DIR, NUTRIENTS, compute_bmi, to_float_series  # noqa: E402
+from engine import recommender as rec                             # noqa: E402
+from anfis_local.infer import ARTIFACTS, score_vectors            # noqa: E402
+
+FEEDBACK_CSV = Path(BASE_DIR) / "data" / "user_feedback.csv"
+RECIPES_CSV  = Path(BASE_DIR) / "data" / "recipes.csv"
+CACHE_DIR    = Path(BASE_DIR) / "data" / "cache"
+NAMES   = ["W_FUZZY_DIET", "W_CALORIE", "W_QUICK", "W_ANFIS_PREF"]
+SEED    = 42
+
+
+def current_weights() -> np.ndarray:
+    return np.array([getattr(rec, n) for n in NAMES], dtype=float)
+
+
+# ───────── components (computed once, cached) ─────────
+def _fuzzy_component(df: pd.DataFrame) -> np.ndarray:
+    """Fuzzy membership of each row's diet_type, one simulator run per distinct input."""
+    from fuzzy_logic import rules
+    keys = pd.DataFrame({
+        "bmi": df["bmi"].round(1), "age": df["age"],
+        "activity_level": df["activity_level"], "satiety": df["satiety"],
+    })
+    out = np.zeros(len(df))
+    diet = df["diet_type"].astype(str).str.strip().str.lower().to_numpy()
+    for key, idx in keys.groupby(list(keys.columns), sort=False).indices.items():
+        bmi, age, act, sat = key
+        rules.get_fuzzy_memberships({"age": age, "activity_level": act, "satiety": sat}, bmi)
+        with contextlib.redirect_stdout(io.StringIO()):    # silence per‑profile fallbacks
+            w = rules.get_fuzzy_output()["diet_type"]
+        out[idx] = [w.get(d, 0.0) for d in diet[idx]]
+    return out
+
+
+def _bucket(df: pd.DataFrame) -> np.ndarray:
+    """Query id: (age decade, BMI band, activity, gender)."""
+    key = (df["age"] // 10).astype(int).astype(str) + "|" \
+        + pd.cut(df["bmi"], [0, 18.5, 25, 30, 35, np.inf]).astype(str) + "|" \
+        + df["activity_level"].astype(str) + "|" + df["gender"].astype(str)
+    return pd.factorize(key)[0]
+
+
+def load_heldout(path: Path = FEEDBACK_CSV) -> pd.DataFrame:
+    df = pd.read_csv(path, low_memory=False)
+    df["satisfaction"] = pd.to_numeric(df["satisfaction"], errors="coerce")
+    df = df[df["satisfaction"].between(1, 5)].reset_index(drop=True)
+    y = df["satisfaction"].astype(int) - 1
+    _, val = train_test_split(np.arange(len(df)), test_size=0.2, stratify=y,
+                              random_state=SEED)
+    df = df.iloc[np.sort(val)].reset_index(drop=True)
+
+    if "gender" not in df.columns: df["gender"] = "M"
+    for col in NUTRIENTS + ["age", "height", "weight", "satiety"]:
+        df[col] = to_float_series(df[col]) if col in df.columns else 0.0
+    if "prep_time" not in df.columns:
+        df["prep_time"] = np.nan
+        if "recipe_id" in df.columns and RECIPES_CSV.exists():
+            prep = pd.read_csv(RECIPES_CSV, usecols=["recipe_id", "prep_time"])
+            df["prep_time"] = df["recipe_id"].map(prep.set_index("recipe_id")["prep_time"])
+    df["bmi"] = compute_bmi(df["weight"], df["height"].replace(0, np.nan))
+    return df
+
+
+def components(path: Path = FEEDBACK_CSV, use_cache: bool = True):
+    """(C (n × 4) in NAMES order, relevance 0‑4, query ids) for the held‑out rows."""
+    key = hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16] + "-" + ARTIFACTS.version
+    cache = CACHE_DIR / f"tune_components-{key}.npz"
+    if use_cache and cache.exists():
+        z = np.load(cache)
+        return z["C"], z["rel"], z["qid"]
+
+    df = load_heldout(path)
+    X = np.column_stack([
+        df["age"], (df["gender"].astype(str).str.upper() == "M").astype(int), df["bmi"].fillna(0),
+        df["activity_level"].map({"Low": 0, "Medium": 1, "High": 2}).fillna(1),
+        df[NUTRIENTS],
+    ]).astype(np.float32)
+    C = np.column_stack([
+        _fuzzy_component(df),
+        rec._calorie_bonus(df["calories"].to_numpy(), df["bmi"].to_numpy()),
+        (df["prep_time"].to_numpy(float) <= 15).astype(float),
+        np.asarray(score_vectors(X)),
+    ])
+    rel = (df["satisfaction"].to_numpy() - 1.0)
+    qid = _bucket(df)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    np.savez(cache, C=C, rel=rel, qid=qid)
+    return C, rel, qid
+
+
+# ───────── vectorised NDCG@k ─────────
+class Evaluator:
+    def __init__(self, C: np.ndarray, rel: np.ndarray, qid: np.ndarray, k: int = 10):
+        self.k = k
+        self.groups = []
+        for idx in pd.Series(np.arange(len(qid))).groupby(qid).indices.values():
+            if len(idx) < 2: continue                 # nothing to rank
+            gain = 2.0 ** rel[idx] - 1.0
+            kk = min(k, len(idx))
+            disc = 1.0 / np.log2(np.arange(2, kk + 2))
+            ideal = (np.sort(gain)[::-1][:kk] * disc).sum()
+            if ideal > 0:
+                self.groups.append((C[idx], gain, disc, ideal))
+
+    def ndcg(self, W: np.ndarray) -> np.ndarray:
+        """Mean NDCG@k for each row of W (m × 4)."""
+        W = np.atleast_2d(W)
+        total = np.zeros(len(W))
+        for Cg, gain, disc, ideal in self.groups:
+            S = Cg @ W.T                              # (n_g × m)
+            kk = len(disc)
+            if kk < len(S):
+                top = np.argpartition(-S, kk - 1, axis=0)[:kk]
+                order = np.argsort(-np.take_along_axis(S, top, 0), axis=0, kind="stable")
+                top = np.take_along_axis(top, order, 0)
+            else:
+                top = np.argsort(-S, axis=0, kind="stable")
+            total += (gain[top] * disc[:, None]).sum(axis=0) / ideal
+        return total / max(len(self.groups), 1)
+
+    def inert(self) -> np.ndarray:
+        """Per component: True if it is constant inside every query."""
+        flat = np.ones(len(NAMES), dtype=bool)
+        for Cg, *_ in self.groups:
+            flat &= np.ptp(Cg, axis=0) <= 1e-12
+        return flat
+
+    def batch(self, W: np.ndarray, n_jobs: int = -1, chunk: int = 256) -> np.ndarray:
+        chunks = [W[i:i + chunk] for i in range(0, len(W), chunk)]
+        if len(chunks) == 1: return self.ndcg(W)
+        parts = Parallel(n_jobs=n_jobs)(delayed(self.ndcg)(c) for c in chunks)
+        return np.concatenate(parts)
+
+
+# ───────── search ─────────
+def random_search(ev: Evaluator, base: np.ndarray, samples: int, rng, n_jobs: int,
+                  free: np.ndarray | None = None):
+    free = np.ones(len(base), dtype=bool) if free is None else free
+    scale = np.where(free, rng.uniform(0.0, 2.0, size=(samples, len(base))), 1.0)
+    W = np.vstack([base, scale * base])
+    scores = ev.batch(W, n_jobs)
+    best = int(np.argmax(scores))
+    return W[best], scores[best]
+
+
+def coordinate_search(ev: Evaluator, start: np.ndarray, rounds: int, n_jobs: int,
+                      grid: int = 41, free: np.ndarray | None = None):
+    free = np.ones(len(start), dtype=bool) if free is None else free
+    w, best = start.copy(), float(ev.ndcg(start)[0])
+    for _ in range(rounds):
+        improved = False
+        for j in np.flatnonzero(free):
+            values = np.linspace(0.0, 2.0 * max(w[j], 0.5), grid)
+            W = np.repeat(w[None, :], grid, axis=0); W[:, j] = values
+            scores = ev.batch(W, n_jobs)
+            i = int(np.argmax(scores))
+            if scores[i] > best + 1e-9:
+                w, best, improved = W[i], float(scores[i]), True
+        if not improved: break
+    return w, best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--feedback", type=Path, default=FEEDBACK_CSV)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--samples", type=int, default=2000)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--jobs", type=int, default=-1)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--no-cache", action="store_true")
+    args = ap.parse_args()
+
+    C, rel, qid = components(args.feedback, use_cache=not args.no_cache)
+    ev = Evaluator(C, rel, qid, k=args.k)
+    base = current_weights()
+    print(f"📦 {len(C):,} held‑out rows, {len(ev.groups)} queries")
+    print(f"current  {dict(zip(NAMES, base))}  NDCG@{args.k} {ev.ndcg(base)[0]:.4f}")
+    inert = ev.inert()
+    for name, b in zip(np.array(NAMES)[inert], base[inert]):
+        print(f"⚠️ {name} is constant within every query – no signal, kept at {b}")
+    if inert.all(): sys.exit("❌ every component is constant; nothing to tune")
+
+    rng = np.random.default_rng(args.seed)
+    w, score = random_search(ev, base, args.samples, rng, args.jobs, ~inert)
+    print(f"random   {dict(zip(NAMES, np.round(w, 3)))}  NDCG@{args.k} {score:.4f}")
+    w, score = coordinate_search(ev, w, args.rounds, args.jobs, free=~inert)
+    print(f"coord    {dict(zip(NAMES, np.round(w, 3)))}  NDCG@{args.k} {score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,43 @@
+import re
+import numpy as np
 import pandas as pd
 import os
 
+NUTRIENTS = ["calories", "total_fat", "sugar", "sodium",
+             "protein", "saturated_fat", "carbs"]
+
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
 
-def load_data():
+def load_data(compacted: bool = False):
+    """(recipes, feedback).  `compacted=True` reads the feedback rollup
+    (see utils.feedback_store: one row per distinct event with `count`)
+    plus the raw tail, instead of the whole append‑only log."""
     recipes = pd.read_csv(os.path.join(BASE_DIR, 'data/recipes.csv'))
-    feedback = pd.read_csv(
-        os.path.join(BASE_DIR, 'data/user_feedback.csv'),
-        dtype={0: str, 7: str, 8: str},  # col 0 = timestamp, 7 = recipe name, 8 = diet type
-        low_memory=False
-    )
-    return recipes, feedback
+    from utils import feedback_store
+    if compacted:
+        return recipes, feedback_store.read()
+    return recipes, feedback_store.read_log()   # schema: feedback_store.COLUMNS
 
 def compute_bmi(weight, height_cm):
     return weight / (height_cm / 100) ** 2
+
+_NUM_EXTRACT = re.compile(r"([-+]?\d*\.?\d+)")
+
+def to_float_series(s: pd.Series) -> pd.Series:
+    cleaned = (
+        s.astype(str)
+         .str.replace(",", "", regex=False)
+         .str.extract(_NUM_EXTRACT, expand=False)
+    )
+    return pd.to_numeric(cleaned, errors="coerce").fillna(0.0)
+
+def recipe_features(recipes: pd.DataFrame) -> np.ndarray:
+    """Cleaned (n, 7) float32 nutrient matrix in `NUTRIENTS` order."""
+    df = recipes.rename(columns={"calories_kcal": "calories", "fat_total": "total_fat"})
+    out = np.zeros((len(df), len(NUTRIENTS)), dtype=np.float32)
+    for j, col in enumerate(NUTRIENTS):
+        if col in df.columns:
+            s = df[col]
+            out[:, j] = (s.fillna(0.0).to_numpy() if pd.api.types.is_numeric_dtype(s)
+                         else to_float_series(s).to_numpy())
+    return out
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Rollup + compaction of the append‑only feedback log.
+
+`compact()` reads the part of `data/user_feedback.csv` appended since the last
+run, collapses identical events – same `timestamp` day, profile (`PROFILE_KEYS`),
+recipe (`RECIPE_KEYS`) and rating – into one row with `count` (rated events)
+and `events` (raw rows), and merges them into one columnar .npz segment per
+day under `data/feedback_compacted/`.  The rating is part of the key, so a
+compacted row is exactly `count` copies of one rating: readers weight by
+`count` (FeedbackMatrix, `train_satisfaction.py --compacted`) and see the
+same data as the raw log.  `manifest.json` records the segments and the
+byte offset of the raw log already folded in, so `read()` loads the segments
+plus only the raw tail written since.  Segment files are versioned by offset
+and the manifest is swapped last, so readers never mix two generations.
+
+    $ python src/utils/feedback_store.py            # incremental
+    $ python src/utils/feedback_store.py --rebuild  # from byte 0
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils.data_loader import BASE_DIR, NUTRIENTS  # noqa: E402
+
+RAW_LOG   = Path(BASE_DIR) / "data" / "user_feedback.csv"
+STORE_DIR = Path(BASE_DIR) / "data" / "feedback_compacted"
+MANIFEST  = "manifest.json"
+
+# ───────── log schema (build_training_data.py and the GUI both write it) ─────────
+DIET_FLAGS = ["is_vegan", "is_balanced", "is_high_protein", "is_low_carb"]
+COLUMNS = (["timestamp", "age", "gender", "height", "weight", "activity_level", "satiety",
+            "recipe_id", "diet_type", "satisfaction"] + NUTRIENTS + DIET_FLAGS)
+RAW_DTYPES = {"timestamp": str, "gender": str, "activity_level": str, "diet_type": str}
+TS_COL = "timestamp"
+
+# rollup key – the nutrients identify rows logged without a recipe_id
+PROFILE_KEYS = ["age", "gender", "height", "weight", "activity_level", "satiety"]
+RECIPE_KEYS  = ["recipe_id", "diet_type"] + NUTRIENTS
+
+_DAY = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+# ───────── raw log ─────────
+def _header(path: Path) -> list[str]:
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+def _complete_end(path: Path) -> int:
+    """Byte offset just past the last complete line (a writer may be mid‑row)."""
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(1 << 16, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b"\n")
+            if nl >= 0: return pos - step + nl + 1
+            pos -= step
+    return 0
+
+def _read_raw(path: Path, header: list[str], start: int, end: int) -> pd.DataFrame:
+    """Raw rows in bytes [start, end); `start` 0 means the header line is included."""
+    with path.open("rb") as f:
+        f.seek(start)
+        blob = f.read(end - start)
+    if not blob.strip(): return pd.DataFrame(columns=header)
+    return pd.read_csv(io.BytesIO(blob), names=header, header=0 if start == 0 else None,
+                       dtype={c: t for c, t in RAW_DTYPES.items() if c in header},
+                       low_memory=False)
+
+def read_log(raw: Path = RAW_LOG) -> pd.DataFrame:
+    """The whole raw log; empty (`COLUMNS`) until the GUI has logged anything."""
+    raw = Path(raw)
+    if not raw.exists(): return pd.DataFrame(columns=COLUMNS)
+    return pd.read_csv(raw, dtype={c: t for c, t in RAW_DTYPES.items() if c in _header(raw)},
+                       low_memory=False)
+
+def feedback_rows(profile: dict, plan: pd.DataFrame, rating: Optional[float] = None,
+                  timestamp: Optional[str] = None) -> pd.DataFrame:
+    """Log rows (`COLUMNS` order) for a plan shown to `profile`; `rating` 1‑5 or None."""
+    diet = plan["diet_type"].astype(str).str.strip().str.lower()
+    rows = pd.DataFrame({
+        "timestamp": timestamp, "age": profile["age"],
+        "gender": str(profile.get("gender", "M")).upper(), "height": profile["height"],
+        "weight": profile["weight"], "activity_level": profile["activity_level"],
+        "satiety": profile.get("satiety", 3), "recipe_id": plan["recipe_id"].to_numpy(),
+        "diet_type": diet.to_numpy(), "satisfaction": np.nan if rating is None else float(rating),
+    }, index=range(len(plan)))
+    for col in NUTRIENTS:
+        rows[col] = plan[col].to_numpy() if col in plan.columns else 0.0
+    for flag in DIET_FLAGS:
+        rows[flag] = (diet.to_numpy() == flag[3:]).astype(int)
+    return rows[COLUMNS]
+
+def migrate(raw: Path = RAW_LOG) -> bool:
+    """
+    Rewrite a log with an older header (pre‑`COLUMNS` installs) into `COLUMNS`;
+    columns it lacks stay empty, the original is kept as `<name>.bak`.
+    """
+    raw = Path(raw)
+    if not raw.exists() or raw.stat().st_size == 0 or _header(raw) == COLUMNS: return False
+    old = read_log(raw)
+    tmp = raw.with_name("tmp_" + raw.name)
+    old.reindex(columns=COLUMNS).to_csv(tmp, index=False)
+    shutil.copy2(raw, raw.with_name(raw.name + ".bak"))
+    os.replace(tmp, raw)
+    return True
+
+def append(rows: pd.DataFrame, raw: Path = RAW_LOG):
+    """Append rows to the raw log (header written if the log is new, migrated if old)."""
+    raw = Path(raw)
+    migrate(raw)
+    new = not raw.exists() or raw.stat().st_size == 0
+    rows[COLUMNS].to_csv(raw, mode="a", header=new, index=False)
+
+
+# ───────── rollup ─────────
+def _day(df: pd.DataFrame, ts_col: Optional[str]) -> pd.Series:
+    if not ts_col or ts_col not in df.columns: return pd.Series("undated", index=df.index)
+    ts = df[ts_col].astype(str)
+    return ts.str[:10].where(ts.str.match(_DAY), "undated")
+
+def rollup(df: pd.DataFrame, ts_col: Optional[str] = TS_COL) -> pd.DataFrame:
+    """
+    Identical events (day, `PROFILE_KEYS`, `RECIPE_KEYS`, rating) → one row.
+    Accepts raw rows and already compacted rows (`count`/`events` present)
+    alike, so segments can be re‑merged.  Other columns keep their first value,
+    `ts_col` its latest.
+    """
+    df = df.copy()
+    df["_day"] = _day(df, ts_col) if "_day" not in df.columns else df["_day"]
+    df["satisfaction"] = (pd.to_numeric(df["satisfaction"], errors="coerce")
+                          if "satisfaction" in df.columns else np.nan)
+    df["count"] = (df["count"].astype(float) if "count" in df.columns
+                   else df["satisfaction"].notna().astype(float))
+    df["events"] = df["events"].astype(float) if "events" in df.columns else 1.0
+
+    keys = ["_day"] + [c for c in PROFILE_KEYS + RECIPE_KEYS if c in df.columns] + ["satisfaction"]
+    agg = {c: "first" for c in df.columns if c not in keys}
+    agg.update(count="sum", events="sum")
+    if ts_col in agg: agg[ts_col] = "max"
+    return df.groupby(keys, dropna=False, sort=False).agg(agg).reset_index()
+
+
+# ───────── segments ─────────
+def _save_segment(path: Path, df: pd.DataFrame) -> list[list[str]]:
+    cols, arrays = [], {}
+    for i, c in enumerate(df.columns):
+        s = df[c]
+        if s.dtype.kind in "biuf":
+            arrays[f"c{i}"] = s.to_numpy()
+        else:
+            arrays[f"c{i}"] = np.asarray(s.astype(object).where(s.notna(), "").astype(str), dtype=str)
+        cols.append([c, s.dtype.kind])
+    tmp = path.with_name("tmp_" + path.name)
+    with tmp.open("wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+    return cols
+
+def _load_segment(path: Path, cols: list[list[str]]) -> pd.DataFrame:
+    z = np.load(path)
+    data = {}
+    for i, (c, kind) in enumerate(cols):
+        a = z[f"c{i}"]
+        data[c] = a if kind in "biuf" else pd.Series(a, dtype=object).where(a != "", np.nan)
+    return pd.DataFrame(data)
+
+def _manifest(store: Path) -> Optional[dict]:
+    p = store / MANIFEST
+    return json.loads(p.read_text()) if p.exists() else None
+
+
+# ───────── public ─────────
+def compact(raw: Path = RAW_LOG, store: Path = STORE_DIR, rebuild: bool = False) -> dict:
+    raw, store = Path(raw), Path(store)
+    if not raw.exists(): return _manifest(store) or {"raw_rows": 0, "segments": {}, "offset": 0}
+    store.mkdir(parents=True, exist_ok=True)
+    man = None if rebuild else _manifest(store)
+    header = _header(raw)
+    end = _complete_end(raw)
+    if man and (man["header"] != header or man["offset"] > end):
+        man = None                                   # log rewritten → start over
+    man = man or {"source": str(raw), "header": header, "offset": 0, "raw_rows": 0,
+                  "columns": None, "segments": {}}
+
+    new = _read_raw(raw, header, man["offset"], end)
+    if new.empty and man["offset"] == end: return man
+    ts_col = TS_COL if TS_COL in header else None
+    rolled = rollup(new, ts_col)
+
+    segments = dict(man["segments"])
+    for day, part in rolled.groupby("_day", sort=True):
+        old = segments.get(day)
+        if old:
+            prev = _load_segment(store / old["file"], man["columns"]).assign(_day=day)
+            part = rollup(pd.concat([prev, part], ignore_index=True), ts_col)
+        name = f"{day}-{end}.npz"
+        cols = _save_segment(store / name, part.drop(columns="_day"))
+        segments[day] = {"file": name, "rows": len(part)}
+
+    superseded = {s["file"] for s in man["segments"].values()} - {s["file"] for s in segments.values()}
+    man.update(offset=end, raw_rows=man["raw_rows"] + len(new), segments=segments,
+               columns=cols if rolled.shape[0] else man["columns"])
+    tmp = store / ("tmp_" + MANIFEST)
+    tmp.write_text(json.dumps(man, indent=1))
+    os.replace(tmp, store / MANIFEST)                # readers switch generation here
+    for f in superseded:
+        (store / f).unlink(missing_ok=True)
+    return man
+
+def read(raw: Path = RAW_LOG, store: Path = STORE_DIR) -> pd.DataFrame:
+    """Compacted segments + raw rows appended since; raw log alone if never compacted."""
+    raw, store = Path(raw), Path(store)
+    for _ in range(2):                               # a compaction may replace files underneath
+        man = _manifest(store)
+        if man is None:
+            return read_log(raw)
+        try:
+            parts = [_load_segment(store / s["file"], man["columns"])
+                     for _, s in sorted(man["segments"].items())]
+            break
+        except FileNotFoundError:
+            continue
+    else:
+        raise FileNotFoundError(f"feedback segments in {store} changed during read")
+    tail = _read_raw(raw, man["header"], man["offset"], _complete_end(raw))
+    if not tail.empty:
+        rated = (pd.to_numeric(tail["satisfaction"], errors="coerce").notna()
+                 if "satisfaction" in tail.columns else False)
+        tail = tail.assign(events=1.0, count=np.asarray(rated, dtype=float))
+    frames = parts + ([tail] if not tail.empty else [])
+    frame = (pd.concat(frames, ignore_index=True) if frames
+             else pd.DataFrame(columns=man["header"] + ["count", "events"]))
+    return frame[man["header"] + ["count", "events"]]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compact the feedback log into daily segments.")
+    ap.add_argument("--raw", type=Path, default=RAW_LOG)
+    ap.add_argument("--store", type=Path, default=STORE_DIR)
+    ap.add_argument("--rebuild", action="store_true", help="ignore the manifest, start at byte 0")
+    args = ap.parse_args()
+
+    man = compact(args.raw, args.store, args.rebuild)
+    rows = sum(s["rows"] for s in man["segments"].values())
+    print(f"✅ {man['raw_rows']:,} raw rows → {rows:,} compacted rows in "
+          f"{len(man['segments'])} segment(s); tail starts at byte {man['offset']:,}")
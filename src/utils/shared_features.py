@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Recipe feature matrix shared by every worker process.
+
+`publish()` parses the catalog's nutrient columns once and writes them – plus
+the recipe‑side ANFIS projection from `anfis_local.infer.project_recipes` – as
+plain `.npy` files under data/cache/.  Workers call `attach()`, which maps the
+files read‑only (`mmap_mode="r"`): the OS page cache holds a single copy no
+matter how many processes attach.  `publish()` records size, mtime and sha256
+of `data/recipes.csv`; `attach()` refuses files published from another
+catalog – a rebuilt catalog reuses recipe ids, so the id lookup alone would
+serve stale nutrients.  The check is a stat, plus one hash of the file if it
+was touched since – workers never parse the catalog for it.
+
+Publish after every catalog build or model rollout:
+    $ python src/utils/shared_features.py
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SRC = Path(__file__).resolve().parents[1]
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from utils.data_loader import BASE_DIR, NUTRIENTS, load_data, recipe_features  # noqa: E402
+
+CACHE_DIR       = Path(BASE_DIR) / "data" / "cache"
+RECIPES_CSV     = Path(BASE_DIR) / "data" / "recipes.csv"
+FEATURES_FILE   = "recipe_features.npy"
+IDS_FILE        = "recipe_ids.npy"
+PROJECTION_FILE = "recipe_projection.npy"
+META_FILE       = "recipe_features.json"
+
+
+def catalog_fingerprint(recipe_ids: np.ndarray, features: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(recipe_ids, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(features, dtype=np.float32).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source(path: Path) -> dict | None:
+    """size / mtime / sha256 of the catalog file the matrix was parsed from."""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _file_sha256(path)}
+
+
+def _save_atomic(path: Path, arr: np.ndarray):
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)                       # readers never see half a file
+
+
+def publish(recipes: pd.DataFrame, out_dir: Path = CACHE_DIR,
+            with_projection: bool = True, source: Path | None = RECIPES_CSV) -> dict:
+    """`source`: the file `recipes` was read from (what `attach()` verifies)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    features = recipe_features(recipes)
+    ids = recipes["recipe_id"].to_numpy(dtype=np.int64)
+    meta = {"rows": len(ids), "columns": NUTRIENTS,
+            "catalog": catalog_fingerprint(ids, features), "model_version": None,
+            "source": _source(source) if source is not None else None}
+
+    _save_atomic(out_dir / FEATURES_FILE, features)
+    _save_atomic(out_dir / IDS_FILE, ids)
+    if with_projection:
+        from anfis_local.infer import project_recipes
+        projection, meta["model_version"] = project_recipes(features)
+        _save_atomic(out_dir / PROJECTION_FILE, projection)
+
+    tmp = out_dir / (META_FILE + ".tmp")
+    tmp.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp, out_dir / META_FILE)
+    return meta
+
+
+class SharedFeatures:
+    """Read‑only, zero‑copy view of a published feature matrix."""
+
+    def __init__(self, out_dir: Path = CACHE_DIR):
+        out_dir = Path(out_dir)
+        self.meta = json.loads((out_dir / META_FILE).read_text())
+        self.features = np.load(out_dir / FEATURES_FILE, mmap_mode="r")
+        self.recipe_ids = np.load(out_dir / IDS_FILE, mmap_mode="r")
+        proj = out_dir / PROJECTION_FILE
+        self.projection = (np.load(proj, mmap_mode="r")
+                           if self.meta.get("model_version") and proj.exists() else None)
+        self._order = np.argsort(self.recipe_ids, kind="stable")
+        self._sorted = np.asarray(self.recipe_ids)[self._order]
+
+    @property
+    def model_version(self) -> str | None:
+        return self.meta.get("model_version")
+
+    def matches(self, source: Path = RECIPES_CSV) -> bool:
+        """True if the files were published from this catalog file (unchanged since)."""
+        rec = self.meta.get("source")
+        try:
+            st = Path(source).stat()
+        except OSError:
+            return False
+        if not rec or st.st_size != rec["size"]: return False
+        return st.st_mtime_ns == rec["mtime_ns"] or _file_sha256(source) == rec["sha256"]
+
+    def aligned(self, recipe_ids) -> bool:
+        """True if row i of the matrix is `recipe_ids[i]` (positional access)."""
+        ids = np.asarray(recipe_ids)
+        return len(ids) == len(self.recipe_ids) and np.array_equal(ids, self.recipe_ids)
+
+    def rows(self, recipe_ids) -> np.ndarray | None:
+        """Matrix row for each recipe id, or None if any id is unknown."""
+        ids = np.asarray(recipe_ids, dtype=np.int64)
+        if len(self._sorted) == 0:
+            return None if len(ids) else ids
+        pos = np.minimum(np.searchsorted(self._sorted, ids), len(self._sorted) - 1)
+        if not np.array_equal(self._sorted[pos], ids):
+            return None
+        return self._order[pos]
+
+
+def attach(out_dir: Path = CACHE_DIR,
+           source: Path | None = RECIPES_CSV) -> SharedFeatures | None:
+    """
+    Map the published matrix; None if nothing has been published yet or if it
+    was published from another version of `source` (None: don't check).
+    """
+    try:
+        sf = SharedFeatures(out_dir)
+    except (OSError, ValueError, KeyError):
+        return None
+    if source is not None and not sf.matches(source):
+        return None
+    return sf
+
+
+if __name__ == "__main__":
+    recipes, _ = load_data()
+    meta = publish(recipes)
+    print(f"✅ Published {meta['rows']:,} recipes → {CACHE_DIR} "
+          f"(catalog {meta['catalog']}, model {meta['model_version']})")